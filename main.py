@@ -7,34 +7,67 @@ Discover businesses via Google Places API and reach out via:
 """
 
 import os
+import sys
 import json
 import csv
+import io
 import sqlite3
 import datetime
 import time
 import random
 import smtplib
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict, field, fields
+from email.utils import formataddr
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+from dataclasses import dataclass, field, fields
 from enum import Enum
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from threading import Thread, RLock
+from threading import Thread, RLock, Lock
 from dotenv import load_dotenv
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import atexit
 import secrets
-from urllib.parse import quote_plus, urlparse
+from urllib.parse import urlparse
 import webbrowser
 import re
 import urllib.parse
+import operator
+import itertools
+from uuid import uuid4
+import functools
 
 load_dotenv()
 
 # Flask
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, has_request_context
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import generate_password_hash, check_password_hash
+import hmac
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from common import RateLimiter, OrjsonProvider
+
+# Column blobs (linkedin_profile) and provider API responses go through orjson when installed
+if orjson:
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Compiled once; used wherever an email address is validated in Python
+EMAIL_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
 
 # ============================================================================
 # DATA MODELS
@@ -70,7 +103,7 @@ class LeadSource(Enum):
     FACEBOOK = "facebook"
     WHATSAPP = "whatsapp"
 
-@dataclass
+@dataclass(slots=True)
 class Lead:
     lead_id: str
     campaign_id: str
@@ -216,18 +249,433 @@ class User:
 # DATABASE
 # ============================================================================
 
+@functools.lru_cache(maxsize=None)
+def _dataclass_keys(cls) -> frozenset:
+    return frozenset(f.name for f in fields(cls))
+
+# Column order for lead rows, resolved once instead of per save. The
+# linkedin_profile blob lives in lead_profiles and is loaded on demand.
+LEAD_FIELDS = tuple(f.name for f in fields(Lead))
+LEAD_COLUMNS = tuple(name for name in LEAD_FIELDS if name != 'linkedin_profile')
+_lead_values = operator.attrgetter(*LEAD_COLUMNS)
+_LEAD_IDX = {name: i for i, name in enumerate(LEAD_COLUMNS)}
+_LEAD_DEFAULTS = ((_LEAD_IDX['rating'], 0.0), (_LEAD_IDX['total_ratings'], 0), (_LEAD_IDX['price_level'], 0))
+
+# Campaign list fields are stored comma-joined, like Lead.types; the form
+# inputs they come from are already split on commas
+CAMPAIGN_COLUMNS = tuple(f.name for f in fields(Campaign))
+_CAMPAIGN_IDX = {name: i for i, name in enumerate(CAMPAIGN_COLUMNS)}
+_CAMPAIGN_LIST_IDX = tuple(_CAMPAIGN_IDX[name] for name in
+                           ('search_queries', 'search_locations', 'ideal_industries', 'channels_enabled'))
+_CAMPAIGN_BOOL_IDX = (_CAMPAIGN_IDX['whatsapp_enabled'], _CAMPAIGN_IDX['facebook_enabled'])
+_campaign_values = operator.attrgetter(*CAMPAIGN_COLUMNS)
+
+def _campaign_to_row(campaign: Campaign) -> list:
+    row = list(_campaign_values(campaign))
+    for idx in _CAMPAIGN_LIST_IDX:
+        row[idx] = ','.join(row[idx] or [])
+    for idx in _CAMPAIGN_BOOL_IDX:
+        row[idx] = int(bool(row[idx]))
+    return row
+
+def _row_to_campaign(row: sqlite3.Row) -> Campaign:
+    """Build a Campaign from a row selected in CAMPAIGN_COLUMNS order"""
+    values = list(row)
+    for idx in _CAMPAIGN_LIST_IDX:
+        values[idx] = [v for v in values[idx].split(',') if v] if values[idx] else []
+    for idx in _CAMPAIGN_BOOL_IDX:
+        values[idx] = bool(values[idx])
+    return Campaign(*values)
+
+_SQL_CREATE_CAMPAIGNS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        campaign_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        status TEXT NOT NULL,
+        search_queries TEXT,
+        search_locations TEXT,
+        max_results_per_search INTEGER DEFAULT 20,
+        ideal_industries TEXT,
+        min_rating REAL DEFAULT 0,
+        max_results INTEGER DEFAULT 100,
+        channels_enabled TEXT,
+        email_subject TEXT,
+        email_body TEXT,
+        whatsapp_template TEXT,
+        whatsapp_enabled INTEGER DEFAULT 0,
+        facebook_template TEXT,
+        facebook_enabled INTEGER DEFAULT 0,
+        notify_email TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+'''
+_SQL_CREATE_LEADS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        lead_id TEXT PRIMARY KEY,
+        campaign_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        company TEXT,
+        email TEXT,
+        phone TEXT,
+        facebook_url TEXT,
+        facebook_id TEXT,
+        website TEXT,
+        industry TEXT,
+        location TEXT,
+        country TEXT,
+        timezone TEXT,
+        notes TEXT,
+        status TEXT NOT NULL,
+        qualification_score INTEGER DEFAULT 0,
+        preferred_channel TEXT DEFAULT 'email',
+        last_contacted TEXT,
+        contact_attempts INTEGER DEFAULT 0,
+        linkedin_url TEXT,
+        source TEXT DEFAULT 'manual',
+        job_title TEXT,
+        place_id TEXT,
+        rating REAL DEFAULT 0,
+        total_ratings INTEGER DEFAULT 0,
+        price_level INTEGER DEFAULT 0,
+        business_status TEXT,
+        types TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (campaign_id) REFERENCES campaigns (campaign_id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+'''
+
+_SQL_CREATE_MESSAGES = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        message_id TEXT PRIMARY KEY,
+        lead_id TEXT NOT NULL,
+        campaign_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        content TEXT NOT NULL,
+        sent_at TEXT NOT NULL,
+        status TEXT NOT NULL,
+        error_message TEXT,
+        read_at TEXT,
+        replied_at TEXT,
+        FOREIGN KEY (lead_id) REFERENCES leads (lead_id),
+        FOREIGN KEY (campaign_id) REFERENCES campaigns (campaign_id) ON DELETE CASCADE
+    )
+'''
+
+_SQL_CREATE_LEAD_PROFILES = '''
+    CREATE TABLE IF NOT EXISTS lead_profiles (
+        lead_id TEXT PRIMARY KEY,
+        profile TEXT NOT NULL,
+        FOREIGN KEY (lead_id) REFERENCES leads (lead_id) ON DELETE CASCADE
+    )
+'''
+
+# Hot statements are hoisted so every call passes the identical string and
+# hits sqlite3's per-connection prepared statement cache
+# Lead rows are selected in LEAD_FIELDS order; list queries leave the profile NULL
+_LEAD_SELECT = ', '.join('NULL' if name == 'linkedin_profile' else name for name in LEAD_FIELDS)
+_LEAD_SELECT_WITH_PROFILE = ', '.join('p.profile' if name == 'linkedin_profile' else f'l.{name}'
+                                      for name in LEAD_FIELDS)
+MESSAGE_COLUMNS = tuple(f.name for f in fields(MessageRecord))
+# Multi-row INSERTs stay under SQLite's historical 999 bound-parameter limit
+_LEAD_ROWS_PER_INSERT = 999 // len(LEAD_COLUMNS)
+
+@functools.lru_cache(maxsize=None)
+def _sql_save_leads(n: int) -> str:
+    """INSERT OR REPLACE statement for n lead rows"""
+    row = f"({', '.join('?' * len(LEAD_COLUMNS))})"
+    return f"INSERT OR REPLACE INTO leads ({', '.join(LEAD_COLUMNS)}) VALUES {', '.join([row] * n)}"
+_SQL_CREATE_USER = '''
+    INSERT INTO users (
+        user_id, username, password_hash, email,
+        email_host, email_user, email_password,
+        google_places_api_key,
+        twilio_account_sid, twilio_auth_token, twilio_whatsapp_number,
+        facebook_page_id, facebook_page_token,
+        sender_name, created_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_GET_USER_BY_USERNAME = 'SELECT * FROM users WHERE username = ?'
+_SQL_GET_USER = 'SELECT * FROM users WHERE user_id = ?'
+# Bumped by every write that changes a user's campaign stats; cached stats
+# are keyed by it, so no explicit invalidation is needed
+_SQL_GET_STATS_VERSION = 'SELECT stats_version FROM users WHERE user_id = ?'
+_SQL_BUMP_STATS_VERSION = 'UPDATE users SET stats_version = stats_version + 1 WHERE user_id = ?'
+_SQL_BUMP_CAMPAIGN_STATS_VERSION = (
+    'UPDATE users SET stats_version = stats_version + 1 '
+    'WHERE user_id = (SELECT user_id FROM campaigns WHERE campaign_id = ?)'
+)
+_SQL_BUMP_MESSAGE_STATS_VERSION = (
+    'UPDATE users SET stats_version = stats_version + 1 '
+    'WHERE user_id = (SELECT user_id FROM messages WHERE message_id = ?)'
+)
+_CAMPAIGN_SELECT = ', '.join(CAMPAIGN_COLUMNS)
+_SQL_GET_USER_CAMPAIGNS = f'SELECT {_CAMPAIGN_SELECT} FROM campaigns WHERE user_id = ? ORDER BY created_at DESC LIMIT ?'
+# Upsert rather than INSERT OR REPLACE: a REPLACE deletes the old row,
+# which would cascade to the campaign's leads and messages
+_SQL_SAVE_CAMPAIGN = (
+    f"INSERT INTO campaigns ({_CAMPAIGN_SELECT}) "
+    f"VALUES ({', '.join('?' * len(CAMPAIGN_COLUMNS))}) "
+    f"ON CONFLICT(campaign_id) DO UPDATE SET "
+    + ', '.join(f"{c} = excluded.{c}" for c in CAMPAIGN_COLUMNS[1:])
+)
+_SQL_GET_CAMPAIGN = f'SELECT {_CAMPAIGN_SELECT} FROM campaigns WHERE campaign_id = ?'
+_SQL_GET_CAMPAIGN_LEADS = f'SELECT {_LEAD_SELECT} FROM leads WHERE campaign_id = ? AND user_id = ? ORDER BY created_at DESC'
+_SQL_LEADS_BY_CHANNEL = {
+    channel: f'''
+        SELECT {_LEAD_SELECT} FROM leads
+        WHERE campaign_id = ? AND user_id = ? AND ({condition})
+        ORDER BY created_at ASC LIMIT ?
+    '''
+    for channel, condition in (
+        (ChannelType.EMAIL.value, "email IS NOT NULL"),  # blanks are stored as NULL
+        (ChannelType.WHATSAPP.value, "phone IS NOT NULL AND phone != '' AND phone != 'null' AND phone != 'None'"),
+        (ChannelType.FACEBOOK.value,
+         "(facebook_url IS NOT NULL AND facebook_url != '') OR (facebook_id IS NOT NULL AND facebook_id != '')"),
+    )
+}
+_SQL_NULL_INVALID_EMAILS = "UPDATE leads SET email = NULL WHERE email IS NOT NULL AND instr(email, '@') = 0"
+_SQL_UPDATE_LEAD = '''
+    UPDATE leads SET
+        status = ?, qualification_score = ?, preferred_channel = ?,
+        last_contacted = ?, contact_attempts = ?,
+        country = ?, timezone = ?, linkedin_url = ?,
+        source = ?, job_title = ?, phone = ?, facebook_url = ?, facebook_id = ?,
+        rating = ?, total_ratings = ?, price_level = ?, business_status = ?, types = ?,
+        updated_at = ?
+    WHERE lead_id = ?
+'''
+_SQL_MARK_LEAD_CONTACTED = '''
+    UPDATE leads SET last_contacted = ?, contact_attempts = ?, preferred_channel = ?, updated_at = ?
+    WHERE lead_id = ?
+'''
+_SQL_GET_LEAD = (
+    f'SELECT {_LEAD_SELECT_WITH_PROFILE} FROM leads l '
+    f'LEFT JOIN lead_profiles p ON p.lead_id = l.lead_id WHERE l.lead_id = ?'
+)
+_SQL_SAVE_LEAD_PROFILE = 'INSERT OR REPLACE INTO lead_profiles (lead_id, profile) VALUES (?, ?)'
+_SQL_SAVE_MESSAGE = '''
+    INSERT INTO messages (
+        message_id, lead_id, campaign_id, user_id, channel,
+        content, sent_at, status, error_message, read_at, replied_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_GET_LEAD_MESSAGES = f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE lead_id = ? ORDER BY sent_at DESC"
+_SQL_GET_CAMPAIGN_PLACE_IDS = (
+    "SELECT place_id FROM leads WHERE campaign_id = ? AND user_id = ? AND place_id IS NOT NULL AND place_id != ''"
+)
+
+# Campaign analytics, aggregated inside SQLite rather than over Lead objects.
+# The per-user variants group the same aggregates by campaign_id.
+_LEAD_STATS_COLUMNS = f'''
+        COUNT(*) AS total,
+        COALESCE(SUM(status = '{LeadStatus.QUALIFIED_HOT.value}'), 0) AS hot,
+        COALESCE(SUM(status = '{LeadStatus.COLD.value}'), 0) AS cold,
+        COALESCE(SUM(trim(coalesce(email, '')) != ''), 0) AS with_email,
+        COALESCE(SUM(trim(coalesce(phone, '')) != ''), 0) AS with_phone,
+        COALESCE(SUM(trim(coalesce(facebook_url, '')) != ''), 0) AS with_facebook,
+        COALESCE(SUM(trim(coalesce(website, '')) != ''), 0) AS with_website,
+        AVG(CASE WHEN typeof(rating) IN ('integer', 'real') AND rating > 0 THEN rating END) AS avg_rating
+'''
+_SQL_CAMPAIGN_LEAD_STATS = f'SELECT {_LEAD_STATS_COLUMNS} FROM leads WHERE campaign_id = ? AND user_id = ?'
+_SQL_USER_LEAD_STATS = (
+    f'SELECT campaign_id, {_LEAD_STATS_COLUMNS} FROM leads WHERE user_id = ? GROUP BY campaign_id'
+)
+_SQL_CAMPAIGN_COUNTRIES = '''
+    SELECT trim(country) AS country, COUNT(*) AS n
+    FROM leads
+    WHERE campaign_id = ? AND user_id = ? AND trim(coalesce(country, '')) != ''
+    GROUP BY trim(country)
+    ORDER BY n DESC, country
+'''
+_SQL_USER_COUNTRIES = '''
+    SELECT campaign_id, trim(country) AS country, COUNT(*) AS n
+    FROM leads
+    WHERE user_id = ? AND trim(coalesce(country, '')) != ''
+    GROUP BY campaign_id, trim(country)
+    ORDER BY campaign_id, n DESC, country
+'''
+_MESSAGE_STATS_COLUMNS = f'''
+        m.channel AS channel,
+        COUNT(*) AS total,
+        COALESCE(SUM(m.status = '{MessageStatus.SENT.value}'), 0) AS sent,
+        COALESCE(SUM(m.status = '{MessageStatus.FAILED.value}'), 0) AS failed,
+        COUNT(NULLIF(m.read_at, '')) AS read,
+        COUNT(NULLIF(m.replied_at, '')) AS replied
+'''
+_SQL_CAMPAIGN_MESSAGE_STATS = f'''
+    SELECT {_MESSAGE_STATS_COLUMNS}
+    FROM messages m
+    WHERE m.lead_id IN (SELECT lead_id FROM leads WHERE campaign_id = ? AND user_id = ?)
+    GROUP BY m.channel
+'''
+# Dashboard-wide totals; channels other than WhatsApp/Facebook count as email,
+# matching the per-campaign channel_stats
+_SQL_USER_TOTALS = f'''
+    SELECT l.*, m.*
+    FROM (
+        SELECT COUNT(*) AS total_leads,
+               COALESCE(SUM(status = '{LeadStatus.QUALIFIED_HOT.value}'), 0) AS total_hot
+        FROM leads WHERE user_id = ?
+    ) l, (
+        SELECT COALESCE(SUM(m.status = '{MessageStatus.SENT.value}'), 0) AS total_messages,
+               COALESCE(SUM(m.status = '{MessageStatus.SENT.value}' AND m.channel NOT IN
+                   ('{ChannelType.WHATSAPP.value}', '{ChannelType.FACEBOOK.value}')), 0) AS email_sent,
+               COALESCE(SUM(m.status = '{MessageStatus.SENT.value}'
+                   AND m.channel = '{ChannelType.WHATSAPP.value}'), 0) AS whatsapp_sent,
+               COALESCE(SUM(m.status = '{MessageStatus.SENT.value}'
+                   AND m.channel = '{ChannelType.FACEBOOK.value}'), 0) AS facebook_sent
+        FROM messages m JOIN leads ld ON ld.lead_id = m.lead_id
+        WHERE ld.user_id = ?
+    ) m
+'''
+_SQL_USER_MESSAGE_STATS = f'''
+    SELECT l.campaign_id AS campaign_id, {_MESSAGE_STATS_COLUMNS}
+    FROM messages m JOIN leads l ON l.lead_id = m.lead_id
+    WHERE l.user_id = ?
+    GROUP BY l.campaign_id, m.channel
+'''
+
+# Low-cardinality lead fields: interning keeps one str object per distinct
+# value instead of one per lead
+_LEAD_INTERNED = ('status', 'source', 'country', 'industry', 'business_status', 'preferred_channel')
+_LEAD_INTERN_IDX = tuple(LEAD_FIELDS.index(name) for name in _LEAD_INTERNED)
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+def _row_to_lead(row: sqlite3.Row) -> Lead:
+    """Build a Lead from a row selected in LEAD_FIELDS order"""
+    values = list(row)
+    for idx in _LEAD_INTERN_IDX:
+        values[idx] = _intern(values[idx])
+    lead = Lead(*values)
+    if lead.linkedin_profile:
+        lead.linkedin_profile = _json_loads(lead.linkedin_profile)
+    # Ensure rating is float
+    if lead.rating is None:
+        lead.rating = 0.0
+    return lead
+
+def _lead_to_row(lead: Lead, user_id: str, campaign_id: str) -> list:
+    row = list(_lead_values(lead))
+    row[_LEAD_IDX['campaign_id']] = campaign_id
+    row[_LEAD_IDX['user_id']] = user_id
+    for idx, default in _LEAD_DEFAULTS:
+        if row[idx] is None:
+            row[idx] = default
+    email = row[_LEAD_IDX['email']]
+    if email is not None and '@' not in email:
+        row[_LEAD_IDX['email']] = None
+    return row
+
+class AppConnection(sqlite3.Connection):
+    """sqlite3 connection that applies the app's per-connection settings on open"""
+
+    # journal_mode=WAL is persisted in the file itself, so it is not repeated here
+    PRAGMAS = """
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
+        PRAGMA busy_timeout=5000;
+        PRAGMA foreign_keys=ON;
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.row_factory = sqlite3.Row
+        self.executescript(self.PRAGMAS)
+
+def _request_cached(kind: str):
+    """Memoize a by-id lookup on flask.g for the rest of the request"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, key):
+            if not has_request_context():  # background threads always hit the DB
+                return func(self, key)
+            cache = g.setdefault('_row_cache', {})
+            if (kind, key) not in cache:
+                cache[(kind, key)] = func(self, key)
+            return cache[(kind, key)]
+        return wrapper
+    return decorator
+
+def _forget_cached(kind: str, *keys):
+    """Drop rows written during this request from the request cache"""
+    cache = g.get('_row_cache') if has_request_context() else None
+    if cache:
+        for key in keys:
+            cache.pop((kind, key), None)
+
 class Database:
-    def __init__(self, db_path="copywriter.db"):
+
+    def __init__(self, db_path="copywriter.db", pool_size=8):
         self.db_path = db_path
+        # Writes are serialized on self.lock; WAL lets readers run beside them
         self.lock = RLock()
+        self._pool = queue.Queue(maxsize=pool_size)
+        self._read_pool = queue.Queue(maxsize=pool_size)
+        atexit.register(self.close)
+        self.enable_wal()
         self.init_db()
         self.migrate_database()
+        self.create_indexes()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            return sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True,
+                                   timeout=30, check_same_thread=False, cached_statements=256,
+                                   factory=AppConnection)
+        return sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                               cached_statements=256, factory=AppConnection)
+
+    def enable_wal(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+
+    def close(self):
+        for pool in (self._pool, self._read_pool):
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    @contextmanager
+    def schema_connection(self):
+        """Unpooled connection with foreign keys off, for table rebuilds.
+
+        With enforcement on, DROP TABLE on a parent runs an implicit DELETE
+        that would cascade into (or be rejected by) its child rows.
+        """
+        with self.lock:
+            conn = self._connect()
+            conn.execute("PRAGMA foreign_keys=OFF")
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.close()
 
     @contextmanager
     def get_connection(self):
         with self.lock:
-            conn = sqlite3.connect(self.db_path, timeout=30)
-            conn.row_factory = sqlite3.Row
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
             try:
                 yield conn
                 conn.commit()
@@ -235,15 +683,37 @@ class Database:
                 conn.rollback()
                 raise e
             finally:
+                try:
+                    self._pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    @contextmanager
+    def get_read_connection(self):
+        """Read-only pooled connection; takes no lock since WAL readers see a stable snapshot"""
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            try:
+                self._read_pool.put_nowait(conn)
+            except queue.Full:
                 conn.close()
 
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict]:
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
+    def execute_query_rows(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self.get_read_connection() as conn:
+            return conn.execute(query, params).fetchall()
+
     def execute_insert(self, query: str, params: tuple) -> int:
         with self.get_connection() as conn:
             cursor = conn.cursor()
@@ -256,66 +726,111 @@ class Database:
             cursor.execute(query, params)
             return cursor.rowcount
 
-    def column_exists(self, table_name: str, column_name: str) -> bool:
-        cols = self.execute_query(f"PRAGMA table_info({table_name})")
-        return any(col['name'] == column_name for col in cols)
+    # Columns added after the first release, per table; bare names are TEXT
+    MIGRATION_COLUMNS = {
+        'users': ('twilio_account_sid', 'twilio_auth_token', 'twilio_whatsapp_number',
+                  'facebook_page_id', 'facebook_page_token', 'sender_name',
+                  'stats_version INTEGER NOT NULL DEFAULT 0'),
+        'leads': ('phone', 'facebook_url', 'facebook_id', 'preferred_channel',
+                  'last_contacted', 'contact_attempts'),
+        'messages': ('read_at', 'replied_at'),
+    }
+
+    def table_columns(self, table_name: str, conn: sqlite3.Connection = None) -> set:
+        query, params = "SELECT name FROM pragma_table_info(?)", (table_name,)
+        rows = conn.execute(query, params).fetchall() if conn else self.execute_query_rows(query, params)
+        return {r['name'] for r in rows}
 
     def migrate_database(self):
-        tables = self.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
-        table_names = [t['name'] for t in tables]
-
-        # Users table migrations
-        if 'users' in table_names:
-            new_user_cols = ['twilio_account_sid', 'twilio_auth_token', 'twilio_whatsapp_number',
-                            'facebook_page_id', 'facebook_page_token', 'sender_name']
-            for col in new_user_cols:
-                if not self.column_exists('users', col):
-                    try:
-                        self.execute_query(f"ALTER TABLE users ADD COLUMN {col} TEXT")
-                    except:
-                        pass
-
-        # Leads table migrations
-        if 'leads' in table_names:
-            new_lead_cols = ['phone', 'facebook_url', 'facebook_id', 'preferred_channel', 
-                            'last_contacted', 'contact_attempts']
-            for col in new_lead_cols:
-                if not self.column_exists('leads', col):
-                    try:
-                        self.execute_query(f"ALTER TABLE leads ADD COLUMN {col} TEXT")
-                    except:
-                        pass
-
-        # Handle messages table
-        if 'messages' not in table_names:
-            # Create messages table if it doesn't exist
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS messages (
-                        message_id TEXT PRIMARY KEY,
-                        lead_id TEXT NOT NULL,
-                        campaign_id TEXT NOT NULL,
-                        user_id TEXT NOT NULL,
-                        channel TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        sent_at TEXT NOT NULL,
-                        status TEXT NOT NULL,
-                        error_message TEXT,
-                        read_at TEXT,
-                        replied_at TEXT,
-                        FOREIGN KEY (lead_id) REFERENCES leads (lead_id)
-                    )
-                ''')
-        else:
-            # Check if messages table needs new columns
-            msg_columns = [col['name'] for col in self.execute_query("PRAGMA table_info(messages)")]
-            for col in ['read_at', 'replied_at']:
-                if col not in msg_columns:
-                    try:
-                        self.execute_query(f"ALTER TABLE messages ADD COLUMN {col} TEXT")
-                    except:
-                        pass
+        with self.get_connection() as conn:
+            table_names = {r['name'] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            statements = []
+            if 'messages' not in table_names:
+                statements.append(_SQL_CREATE_MESSAGES.format(table='messages'))
+            for table, new_cols in self.MIGRATION_COLUMNS.items():
+                if table not in table_names:
+                    continue
+                existing = self.table_columns(table, conn)
+                statements.extend(f"ALTER TABLE {table} ADD COLUMN {col if ' ' in col else col + ' TEXT'}"
+                                  for col in new_cols if col.split()[0] not in existing)
+
+            # All DDL in one script and one transaction
+            if statements:
+                try:
+                    conn.executescript("BEGIN;\n" + ";\n".join(statements) + ";\nCOMMIT;")
+                except sqlite3.OperationalError as e:
+                    # Another worker migrated first; its script was identical.
+                    # Anything else (locked, I/O, bad SQL) must not be hidden
+                    conn.rollback()
+                    if 'duplicate column name' not in str(e):
+                        raise
+
+            # Leads saved before email normalization kept '', 'null' and 'None'
+            if conn.execute(_SQL_NULL_INVALID_EMAILS).rowcount:
+                conn.execute('UPDATE users SET stats_version = stats_version + 1')
+
+            # Campaigns table: unpack the legacy JSON config blob into columns
+            needs_config_migration = 'campaigns' in table_names and 'config' in self.table_columns('campaigns', conn)
+            # Campaign deletes cascade to leads and messages
+            needs_rebuild = [
+                (table, create_sql)
+                for table, create_sql in (('leads', _SQL_CREATE_LEADS), ('messages', _SQL_CREATE_MESSAGES))
+                if not conn.execute(
+                    "SELECT 1 FROM pragma_foreign_key_list(?) WHERE \"table\" = 'campaigns' AND on_delete = 'CASCADE'",
+                    (table,)
+                ).fetchone()
+            ]
+
+        if needs_config_migration:
+            self._migrate_campaign_config()
+        for table, create_sql in needs_rebuild:
+            self._rebuild_table(table, create_sql)
+        if 'linkedin_profile' in self.table_columns('leads'):
+            self._migrate_lead_profiles()
+
+    def _rebuild_table(self, table: str, create_sql: str):
+        """Recreate a table from create_sql and copy its rows, keeping any extra legacy columns"""
+        with self.schema_connection() as conn:
+            old_cols = [c['name'] for c in conn.execute("SELECT name FROM pragma_table_info(?)", (table,))]
+            conn.execute(create_sql.format(table=f'{table}_new'))
+            new_cols = self.table_columns(f'{table}_new', conn)
+            for col in old_cols:
+                if col not in new_cols:
+                    conn.execute(f"ALTER TABLE {table}_new ADD COLUMN {col}")
+            cols = ', '.join(old_cols)
+            conn.execute(f"INSERT INTO {table}_new ({cols}) SELECT {cols} FROM {table}")
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+    def _migrate_lead_profiles(self):
+        """Move linkedin_profile blobs from leads into lead_profiles"""
+        with self.get_connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO lead_profiles (lead_id, profile) "
+                "SELECT lead_id, linkedin_profile FROM leads WHERE linkedin_profile IS NOT NULL"
+            )
+            try:
+                conn.execute("ALTER TABLE leads DROP COLUMN linkedin_profile")
+            except sqlite3.OperationalError:
+                # SQLite before 3.35 has no DROP COLUMN; empty it instead
+                conn.execute("UPDATE leads SET linkedin_profile = NULL WHERE linkedin_profile IS NOT NULL")
+
+    def _migrate_campaign_config(self):
+        """Rebuild campaigns with one column per Campaign field, parsed from config"""
+        with self.schema_connection() as conn:
+            rows = []
+            for r in conn.execute('SELECT campaign_id, user_id, name, config, created_at, status FROM campaigns'):
+                base = {k: r[k] for k in ('campaign_id', 'user_id', 'name', 'created_at', 'status')}
+                try:
+                    data = {**json.loads(r['config']), **base}
+                except (TypeError, ValueError):
+                    print(f"⚠️ Campaign {r['campaign_id']}: unreadable config, keeping base fields only")
+                    data = base
+                rows.append(_campaign_to_row(Campaign.from_dict(data)))
+            conn.execute(_SQL_CREATE_CAMPAIGNS.format(table='campaigns_new'))
+            conn.executemany(_SQL_SAVE_CAMPAIGN.replace('INTO campaigns', 'INTO campaigns_new'), rows)
+            conn.execute('DROP TABLE campaigns')
+            conn.execute('ALTER TABLE campaigns_new RENAME TO campaigns')
 
     def init_db(self):
         with self.get_connection() as conn:
@@ -338,96 +853,47 @@ class Database:
                     facebook_page_id TEXT,
                     facebook_page_token TEXT,
                     sender_name TEXT,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    stats_version INTEGER NOT NULL DEFAULT 0
                 )
             ''')
             
             # Campaigns table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS campaigns (
-                    campaign_id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    config TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
+            cursor.execute(_SQL_CREATE_CAMPAIGNS.format(table='campaigns'))
             
             # Leads table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS leads (
-                    lead_id TEXT PRIMARY KEY,
-                    campaign_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    company TEXT,
-                    email TEXT,
-                    phone TEXT,
-                    facebook_url TEXT,
-                    facebook_id TEXT,
-                    website TEXT,
-                    industry TEXT,
-                    location TEXT,
-                    country TEXT,
-                    timezone TEXT,
-                    notes TEXT,
-                    status TEXT NOT NULL,
-                    qualification_score INTEGER DEFAULT 0,
-                    preferred_channel TEXT DEFAULT 'email',
-                    last_contacted TEXT,
-                    contact_attempts INTEGER DEFAULT 0,
-                    linkedin_url TEXT,
-                    linkedin_profile TEXT,
-                    source TEXT DEFAULT 'manual',
-                    job_title TEXT,
-                    place_id TEXT,
-                    rating REAL DEFAULT 0,
-                    total_ratings INTEGER DEFAULT 0,
-                    price_level INTEGER DEFAULT 0,
-                    business_status TEXT,
-                    types TEXT,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    FOREIGN KEY (campaign_id) REFERENCES campaigns (campaign_id),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
+            cursor.execute(_SQL_CREATE_LEADS.format(table='leads'))
             
             # Messages table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    message_id TEXT PRIMARY KEY,
-                    lead_id TEXT NOT NULL,
-                    campaign_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    channel TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    sent_at TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    error_message TEXT,
-                    read_at TEXT,
-                    replied_at TEXT,
-                    FOREIGN KEY (lead_id) REFERENCES leads (lead_id)
-                )
+            cursor.execute(_SQL_CREATE_MESSAGES.format(table='messages'))
+            
+            # LinkedIn profile blobs, kept out of the leads rows
+            cursor.execute(_SQL_CREATE_LEAD_PROFILES)
+
+    def create_indexes(self):
+        """Indexes for the hot lookups; runs after migrations so legacy tables have every column"""
+        with self.get_connection() as conn:
+            conn.executescript('''
+                CREATE INDEX IF NOT EXISTS idx_leads_camp_user_created
+                    ON leads(campaign_id, user_id, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_leads_user_campaign
+                    ON leads(user_id, campaign_id);
+                CREATE INDEX IF NOT EXISTS idx_leads_email_partial
+                    ON leads(campaign_id, user_id, created_at) WHERE email IS NOT NULL;
+                CREATE INDEX IF NOT EXISTS idx_messages_lead_sent
+                    ON messages(lead_id, sent_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_messages_campaign
+                    ON messages(campaign_id);
+                DROP INDEX IF EXISTS idx_campaigns_user;
+                CREATE INDEX IF NOT EXISTS idx_campaigns_user_created
+                    ON campaigns(user_id, created_at DESC);
             ''')
 
     def _filter_to_dataclass(self, cls, data: dict) -> dict:
-        valid_keys = {f.name for f in fields(cls)}
-        return {k: v for k, v in data.items() if k in valid_keys}
+        return {k: data[k] for k in _dataclass_keys(cls) & data.keys()}
 
     def create_user(self, user: User):
-        self.execute_insert('''
-            INSERT INTO users (
-                user_id, username, password_hash, email, 
-                email_host, email_user, email_password,
-                google_places_api_key,
-                twilio_account_sid, twilio_auth_token, twilio_whatsapp_number,
-                facebook_page_id, facebook_page_token,
-                sender_name, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        self.execute_insert(_SQL_CREATE_USER, (
             user.user_id, user.username, user.password_hash, user.email,
             user.email_host, user.email_user or '', user.email_password or '',
             user.google_places_api_key or '',
@@ -437,14 +903,15 @@ class Database:
         ))
 
     def get_user_by_username(self, username: str) -> Optional[User]:
-        row = self.execute_query('SELECT * FROM users WHERE username = ?', (username,))
+        row = self.execute_query(_SQL_GET_USER_BY_USERNAME, (username,))
         if row:
             filtered = self._filter_to_dataclass(User, row[0])
             return User(**filtered)
         return None
 
+    @_request_cached('user')
     def get_user(self, user_id: str) -> Optional[User]:
-        row = self.execute_query('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        row = self.execute_query(_SQL_GET_USER, (user_id,))
         if row:
             filtered = self._filter_to_dataclass(User, row[0])
             return User(**filtered)
@@ -459,117 +926,62 @@ class Database:
         values.append(user_id)
         query = f"UPDATE users SET {', '.join(sets)} WHERE user_id = ?"
         self.execute_update(query, tuple(values))
+        _forget_cached('user', user_id)
 
-    def get_user_campaigns(self, user_id: str) -> List[Campaign]:
-        rows = self.execute_query('SELECT config FROM campaigns WHERE user_id = ?', (user_id,))
-        campaigns = []
-        for r in rows:
-            try:
-                data = json.loads(r['config'])
-                data['user_id'] = user_id
-                campaigns.append(Campaign.from_dict(data))
-            except:
-                continue
-        return campaigns
+    def get_user_campaigns(self, user_id: str, limit: int = -1) -> List[Campaign]:
+        """Newest campaigns first; a negative limit returns all of them"""
+        rows = self.execute_query_rows(_SQL_GET_USER_CAMPAIGNS, (user_id, limit))
+        return [_row_to_campaign(r) for r in rows]
 
     def save_campaign(self, user_id: str, campaign: Campaign):
         campaign.user_id = user_id
-        self.execute_insert('''
-            INSERT OR REPLACE INTO campaigns (campaign_id, user_id, name, config, created_at, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (campaign.campaign_id, user_id, campaign.name, json.dumps(asdict(campaign)),
-              campaign.created_at, campaign.status))
+        with self.get_connection() as conn:
+            conn.execute(_SQL_SAVE_CAMPAIGN, _campaign_to_row(campaign))
+            conn.execute(_SQL_BUMP_STATS_VERSION, (user_id,))
+        _forget_cached('campaign', campaign.campaign_id)
 
+    @_request_cached('campaign')
     def get_campaign(self, campaign_id: str) -> Optional[Campaign]:
-        row = self.execute_query('SELECT user_id, config FROM campaigns WHERE campaign_id = ?', (campaign_id,))
+        row = self.execute_query_rows(_SQL_GET_CAMPAIGN, (campaign_id,))
         if row:
-            try:
-                data = json.loads(row[0]['config'])
-                data['user_id'] = row[0]['user_id']
-                return Campaign.from_dict(data)
-            except:
-                return None
+            return _row_to_campaign(row[0])
         return None
 
     def delete_campaign(self, campaign_id: str):
+        # Leads and messages go with it via ON DELETE CASCADE
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM messages WHERE campaign_id = ?', (campaign_id,))
-            cursor.execute('DELETE FROM leads WHERE campaign_id = ?', (campaign_id,))
-            cursor.execute('DELETE FROM campaigns WHERE campaign_id = ?', (campaign_id,))
+            conn.execute(_SQL_BUMP_CAMPAIGN_STATS_VERSION, (campaign_id,))
+            conn.execute('DELETE FROM campaigns WHERE campaign_id = ?', (campaign_id,))
+        if has_request_context():
+            g.pop('_row_cache', None)  # cached leads may belong to it too
 
     def save_leads(self, user_id: str, campaign_id: str, leads: List[Lead]):
+        rows = [_lead_to_row(lead, user_id, campaign_id) for lead in leads]
+        if not rows:
+            return
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            for lead in leads:
-                # Ensure rating is not None
-                rating = lead.rating if lead.rating is not None else 0.0
-                total_ratings = lead.total_ratings if lead.total_ratings is not None else 0
-                price_level = lead.price_level if lead.price_level is not None else 0
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO leads (
-                        lead_id, campaign_id, user_id, name, company, email, phone,
-                        facebook_url, facebook_id, website, industry, location, country,
-                        timezone, notes, status, qualification_score, preferred_channel,
-                        last_contacted, contact_attempts, linkedin_url, linkedin_profile,
-                        source, job_title, place_id, rating, total_ratings, price_level,
-                        business_status, types, created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    lead.lead_id, campaign_id, user_id, lead.name, lead.company,
-                    lead.email, lead.phone, lead.facebook_url, lead.facebook_id,
-                    lead.website, lead.industry, lead.location, lead.country,
-                    lead.timezone, lead.notes, lead.status, lead.qualification_score,
-                    lead.preferred_channel, lead.last_contacted, lead.contact_attempts,
-                    lead.linkedin_url, json.dumps(lead.linkedin_profile) if lead.linkedin_profile else None,
-                    lead.source, lead.job_title, lead.place_id, rating,
-                    total_ratings, price_level, lead.business_status,
-                    lead.types, lead.created_at, lead.updated_at
-                ))
+            conn.execute("BEGIN IMMEDIATE")
+            for i in range(0, len(rows), _LEAD_ROWS_PER_INSERT):
+                chunk = rows[i:i + _LEAD_ROWS_PER_INSERT]
+                conn.execute(_sql_save_leads(len(chunk)), list(itertools.chain.from_iterable(chunk)))
+            # After the leads: replacing a lead cascades away its old profile
+            conn.executemany(_SQL_SAVE_LEAD_PROFILE, [
+                (lead.lead_id, _json_dumps(lead.linkedin_profile)) for lead in leads if lead.linkedin_profile
+            ])
+            conn.execute(_SQL_BUMP_STATS_VERSION, (user_id,))
 
     def get_campaign_leads(self, user_id: str, campaign_id: str) -> List[Lead]:
-        rows = self.execute_query('SELECT * FROM leads WHERE campaign_id = ? AND user_id = ? ORDER BY created_at DESC',
-                                   (campaign_id, user_id))
-        leads = []
-        for r in rows:
-            filtered = self._filter_to_dataclass(Lead, r)
-            lead = Lead(**filtered)
-            if r.get('linkedin_profile'):
-                lead.linkedin_profile = json.loads(r['linkedin_profile'])
-            # Ensure rating is float
-            if lead.rating is None:
-                lead.rating = 0.0
-            leads.append(lead)
-        return leads
+        rows = self.execute_query_rows(_SQL_GET_CAMPAIGN_LEADS, (campaign_id, user_id))
+        return [_row_to_lead(r) for r in rows]
 
     def get_leads_by_channel(self, user_id: str, campaign_id: str, channel: str, limit: int = 50) -> List[Lead]:
         """Get leads that have contact info for a specific channel"""
-        if channel == ChannelType.EMAIL.value:
-            condition = "email IS NOT NULL AND email != '' AND email != 'null' AND email != 'None'"
-        elif channel == ChannelType.WHATSAPP.value:
-            condition = "phone IS NOT NULL AND phone != '' AND phone != 'null' AND phone != 'None'"
-        elif channel == ChannelType.FACEBOOK.value:
-            condition = "(facebook_url IS NOT NULL AND facebook_url != '') OR (facebook_id IS NOT NULL AND facebook_id != '')"
-        else:
+        query = _SQL_LEADS_BY_CHANNEL.get(channel)
+        if not query:
             return []
         
-        rows = self.execute_query(f'''
-            SELECT * FROM leads
-            WHERE campaign_id = ? AND user_id = ? AND {condition}
-            ORDER BY created_at ASC LIMIT ?
-        ''', (campaign_id, user_id, limit))
-        
-        leads = []
-        for r in rows:
-            filtered = self._filter_to_dataclass(Lead, r)
-            lead = Lead(**filtered)
-            if r.get('linkedin_profile'):
-                lead.linkedin_profile = json.loads(r['linkedin_profile'])
-            if lead.rating is None:
-                lead.rating = 0.0
-            leads.append(lead)
-        return leads
+        rows = self.execute_query_rows(query, (campaign_id, user_id, limit))
+        return [_row_to_lead(r) for r in rows]
 
     def update_lead(self, lead: Lead):
         lead.updated_at = datetime.datetime.now().isoformat()
@@ -577,57 +989,134 @@ class Database:
         total_ratings = lead.total_ratings if lead.total_ratings is not None else 0
         price_level = lead.price_level if lead.price_level is not None else 0
         
-        self.execute_update('''
-            UPDATE leads SET 
-                status = ?, qualification_score = ?, preferred_channel = ?,
-                last_contacted = ?, contact_attempts = ?,
-                country = ?, timezone = ?, linkedin_url = ?, linkedin_profile = ?,
-                source = ?, job_title = ?, phone = ?, facebook_url = ?, facebook_id = ?,
-                rating = ?, total_ratings = ?, price_level = ?, business_status = ?, types = ?,
-                updated_at = ?
-            WHERE lead_id = ?
-        ''', (
-            lead.status, lead.qualification_score, lead.preferred_channel,
-            lead.last_contacted, lead.contact_attempts,
-            lead.country, lead.timezone, lead.linkedin_url,
-            json.dumps(lead.linkedin_profile) if lead.linkedin_profile else None,
-            lead.source, lead.job_title, lead.phone, lead.facebook_url, lead.facebook_id,
-            rating, total_ratings, price_level, lead.business_status, lead.types,
-            lead.updated_at, lead.lead_id
-        ))
-
+        with self.get_connection() as conn:
+            conn.execute(_SQL_UPDATE_LEAD, (
+                lead.status, lead.qualification_score, lead.preferred_channel,
+                lead.last_contacted, lead.contact_attempts,
+                lead.country, lead.timezone, lead.linkedin_url,
+                lead.source, lead.job_title, lead.phone, lead.facebook_url, lead.facebook_id,
+                rating, total_ratings, price_level, lead.business_status, lead.types,
+                lead.updated_at, lead.lead_id
+            ))
+            # Leads from list queries carry no profile; None means "not loaded", so keep the stored one
+            if lead.linkedin_profile:
+                conn.execute(_SQL_SAVE_LEAD_PROFILE, (lead.lead_id, _json_dumps(lead.linkedin_profile)))
+            conn.execute(_SQL_BUMP_STATS_VERSION, (lead.user_id,))
+        _forget_cached('lead', lead.lead_id)
+
+    @_request_cached('lead')
     def get_lead(self, lead_id: str) -> Optional[Lead]:
-        r = self.execute_query('SELECT * FROM leads WHERE lead_id = ?', (lead_id,))
+        r = self.execute_query_rows(_SQL_GET_LEAD, (lead_id,))
         if r:
-            filtered = self._filter_to_dataclass(Lead, r[0])
-            lead = Lead(**filtered)
-            if r[0].get('linkedin_profile'):
-                lead.linkedin_profile = json.loads(r[0]['linkedin_profile'])
-            if lead.rating is None:
-                lead.rating = 0.0
-            return lead
+            return _row_to_lead(r[0])
         return None
 
+    def increment_contact_attempts(self, lead_ids: List[str]):
+        """Bump contact_attempts for a batch of leads in one statement"""
+        if not lead_ids:
+            return
+        now = datetime.datetime.now().isoformat()
+        placeholders = ','.join('?' * len(lead_ids))
+        self.execute_update(
+            f'UPDATE leads SET contact_attempts = contact_attempts + 1, updated_at = ? '
+            f'WHERE lead_id IN ({placeholders})',
+            (now, *lead_ids)
+        )
+        _forget_cached('lead', *lead_ids)
+
+    def record_sent_messages(self, user_id: str, sent: List[Tuple[MessageRecord, Lead]]):
+        """Save a batch of sent messages and their leads' contact fields in one transaction"""
+        if not sent:
+            return
+        now = datetime.datetime.now().isoformat()
+        for message, lead in sent:
+            message.user_id = user_id
+            lead.updated_at = now
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(_SQL_SAVE_MESSAGE, [(
+                m.message_id, m.lead_id, m.campaign_id, user_id,
+                m.channel, m.content, m.sent_at, m.status,
+                m.error_message, m.read_at, m.replied_at
+            ) for m, _ in sent])
+            conn.executemany(_SQL_MARK_LEAD_CONTACTED, [
+                (l.last_contacted, l.contact_attempts, l.preferred_channel, l.updated_at, l.lead_id)
+                for _, l in sent
+            ])
+            conn.execute(_SQL_BUMP_STATS_VERSION, (user_id,))
+
     def save_message(self, user_id: str, message: MessageRecord):
         message.user_id = user_id
-        self.execute_insert('''
-            INSERT INTO messages (
-                message_id, lead_id, campaign_id, user_id, channel,
-                content, sent_at, status, error_message, read_at, replied_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            message.message_id, message.lead_id, message.campaign_id, user_id,
-            message.channel, message.content, message.sent_at, message.status,
-            message.error_message, message.read_at, message.replied_at
-        ))
+        with self.get_connection() as conn:
+            conn.execute(_SQL_SAVE_MESSAGE, (
+                message.message_id, message.lead_id, message.campaign_id, user_id,
+                message.channel, message.content, message.sent_at, message.status,
+                message.error_message, message.read_at, message.replied_at
+            ))
+            conn.execute(_SQL_BUMP_STATS_VERSION, (user_id,))
 
     def get_lead_messages(self, lead_id: str) -> List[MessageRecord]:
-        rows = self.execute_query('SELECT * FROM messages WHERE lead_id = ? ORDER BY sent_at DESC', (lead_id,))
-        messages = []
-        for r in rows:
-            filtered = self._filter_to_dataclass(MessageRecord, r)
-            messages.append(MessageRecord(**filtered))
-        return messages
+        rows = self.execute_query_rows(_SQL_GET_LEAD_MESSAGES, (lead_id,))
+        return [MessageRecord(*r) for r in rows]
+
+    def get_campaign_place_ids(self, user_id: str, campaign_id: str) -> set:
+        rows = self.execute_query_rows(_SQL_GET_CAMPAIGN_PLACE_IDS, (campaign_id, user_id))
+        return {r[0] for r in rows}
+
+    def get_campaign_lead_stats(self, user_id: str, campaign_id: str) -> Dict:
+        return self.execute_query(_SQL_CAMPAIGN_LEAD_STATS, (campaign_id, user_id))[0]
+
+    def get_campaign_country_counts(self, user_id: str, campaign_id: str) -> List[tuple]:
+        """(country, lead count) pairs, most common first"""
+        rows = self.execute_query_rows(_SQL_CAMPAIGN_COUNTRIES, (campaign_id, user_id))
+        return [tuple(r) for r in rows]
+
+    def get_campaign_message_stats(self, user_id: str, campaign_id: str) -> List[Dict]:
+        """Per-channel message counts for the campaign's leads"""
+        return self.execute_query(_SQL_CAMPAIGN_MESSAGE_STATS, (campaign_id, user_id))
+
+    def get_user_lead_stats(self, user_id: str) -> Dict[str, Dict]:
+        """get_campaign_lead_stats for every campaign of the user, keyed by campaign_id"""
+        return {r['campaign_id']: r for r in self.execute_query(_SQL_USER_LEAD_STATS, (user_id,))}
+
+    def get_user_country_counts(self, user_id: str) -> Dict[str, List[tuple]]:
+        counts = {}
+        for r in self.execute_query_rows(_SQL_USER_COUNTRIES, (user_id,)):
+            counts.setdefault(r['campaign_id'], []).append((r['country'], r['n']))
+        return counts
+
+    def get_user_message_stats(self, user_id: str) -> Dict[str, List[Dict]]:
+        stats = {}
+        for r in self.execute_query(_SQL_USER_MESSAGE_STATS, (user_id,)):
+            stats.setdefault(r['campaign_id'], []).append(r)
+        return stats
+
+    def get_user_stats_rows(self, user_id: str) -> tuple:
+        """(lead stats, message stats, country counts) for all the user's campaigns.
+
+        Cached until the user's stats_version changes, so repeat dashboard
+        loads cost one primary-key lookup. Callers must not mutate the result.
+        """
+        return self._user_cached(user_id, self._stats_version(user_id), '_fetch_user_stats_rows')
+
+    def get_user_totals(self, user_id: str) -> Dict:
+        """Lead and sent-message totals across all the user's campaigns; cached like get_user_stats_rows"""
+        return self._user_cached(user_id, self._stats_version(user_id), '_fetch_user_totals')
+
+    def _stats_version(self, user_id: str):
+        r = self.execute_query_rows(_SQL_GET_STATS_VERSION, (user_id,))
+        return r[0][0] if r else None
+
+    @functools.lru_cache(maxsize=512)
+    def _user_cached(self, user_id: str, version, fetch: str):
+        return getattr(self, fetch)(user_id)
+
+    def _fetch_user_stats_rows(self, user_id: str) -> tuple:
+        return (self.get_user_lead_stats(user_id), self.get_user_message_stats(user_id),
+                self.get_user_country_counts(user_id))
+
+    def _fetch_user_totals(self, user_id: str) -> Dict:
+        return self.execute_query(_SQL_USER_TOTALS, (user_id, user_id))[0]
 
     def update_message_status(self, message_id: str, status: str, **kwargs):
         sets = ["status = ?"]
@@ -637,27 +1126,86 @@ class Database:
             values.append(value)
         values.append(message_id)
         query = f"UPDATE messages SET {', '.join(sets)} WHERE message_id = ?"
-        self.execute_update(query, tuple(values))
+        with self.get_connection() as conn:
+            conn.execute(query, tuple(values))
+            conn.execute(_SQL_BUMP_MESSAGE_STATS_VERSION, (message_id,))
+
+# ============================================================================
+# HTTP SESSION
+# ============================================================================
+
+# Shared keep-alive pool so repeated provider calls skip DNS + TLS setup
+HTTP_SESSION = requests.Session()
+# Retries cover dropped connections, rate limits (honouring Retry-After) and 5xx
+# on idempotent calls; POSTs such as Messenger sends are never replayed
+HTTP_RETRY = Retry(total=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                   raise_on_status=False)
+HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=HTTP_RETRY))
+# Places searchText is a read-only POST, so it is safe to retry as well
+HTTP_SESSION.mount('https://places.googleapis.com/', HTTPAdapter(
+    pool_connections=1, pool_maxsize=32,
+    max_retries=HTTP_RETRY.new(allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'POST'})
+))
+HTTP_SESSION.headers['User-Agent'] = 'CopywriterPro/1.0'
+# (connect, read) seconds; without one a stalled socket pins a pool worker forever
+HTTP_TIMEOUT = (3.05, 10)
 
 # ============================================================================
 # GOOGLE PLACES API DISCOVERY
 # ============================================================================
 
+# Shared by every search (and user), so it also bounds total in-flight Place
+# Details calls per process; worker threads are reused across searches
+PLACES_DETAILS_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix='places-details')
+# Paces every Places request in the process instead of fixed sleeps between calls
+PLACES_RATE_LIMIT = RateLimiter(rate=20)
+
+@functools.lru_cache(maxsize=4096)
+def _url_host(url: str) -> str:
+    """Lowercased host of a URL without any leading 'www.'; scheme is optional"""
+    url = url.strip().lower()
+    if url.startswith(('http://', 'https://')):
+        host = url.split('/', 3)[2]
+    elif '://' in url:
+        host = urlparse(url).netloc
+    else:
+        host = url.split('/', 1)[0]
+    return host.rsplit('@', 1)[-1].split(':', 1)[0].removeprefix('www.')
+
 class GooglePlacesDiscovery:
     """Lead discovery using Google Places API"""
     
     BASE_URL = "https://maps.googleapis.com/maps/api/place"
     
-    def __init__(self, api_key=None):
+    # Places API (New) returns contact details in the search response itself,
+    # so one request replaces a text search plus one details call per place
+    SEARCH_TEXT_URL = "https://places.googleapis.com/v1/places:searchText"
+    SEARCH_TEXT_FIELDS = ','.join(f'places.{f}' for f in (
+        'id', 'displayName', 'formattedAddress', 'nationalPhoneNumber', 'websiteUri',
+        'rating', 'userRatingCount', 'priceLevel', 'businessStatus', 'types', 'googleMapsUri'
+    ))
+    # Place types too generic to describe a business
+    GENERIC_TYPES = frozenset(('establishment', 'point_of_interest', 'food', 'store'))
+    PRICE_LEVELS = {
+        'PRICE_LEVEL_FREE': 0, 'PRICE_LEVEL_INEXPENSIVE': 1, 'PRICE_LEVEL_MODERATE': 2,
+        'PRICE_LEVEL_EXPENSIVE': 3, 'PRICE_LEVEL_VERY_EXPENSIVE': 4,
+    }
+    
+    def __init__(self, api_key=None, session: requests.Session = None):
         self.api_key = api_key
         self.authenticated = bool(api_key)
+        self.session = session or HTTP_SESSION
+        self.use_search_text = True
     
     def set_api_key(self, api_key):
+        if api_key != self.api_key:
+            self.use_search_text = True
         self.api_key = api_key
         self.authenticated = bool(api_key)
     
-    def search_places(self, query: str, location: str = "", max_results: int = 20) -> List[Dict]:
-        """Search for businesses using Google Places API"""
+    def search_places(self, query: str, location: str = "", max_results: int = 20,
+                      min_rating: float = 0.0) -> List[Dict]:
+        """Search for businesses using Google Places API, dropping places rated below min_rating"""
         if not self.authenticated or not self.api_key:
             print("❌ Google Places API key not configured")
             return []
@@ -666,19 +1214,28 @@ class GooglePlacesDiscovery:
         
         try:
             print(f"🔍 Google Places: Searching for '{query}' in '{location or 'any'}'")
+            search_text = f"{query} in {location}" if location else query
             
-            # Text Search to find places
+            if self.use_search_text:
+                businesses = self._search_text(search_text, max_results, min_rating)
+                if businesses is not None:
+                    print(f"✅ Google Places: Found {len(businesses)} businesses with details")
+                    return businesses
+                businesses = []
+            
+            # Legacy Text Search, then Place Details per result
             search_url = f"{self.BASE_URL}/textsearch/json"
-            search_text = f"{query} in {location}" if location else query
             
+            # Text Search has no result-limit parameter (pages are fixed at 20),
+            # so the cap is enforced by only fetching details for max_results places
             params = {
                 'query': search_text,
-                'key': self.api_key,
-                'maxresults': min(max_results, 20)
+                'key': self.api_key
             }
             
-            response = requests.get(search_url, params=params)
-            data = response.json()
+            PLACES_RATE_LIMIT.acquire()
+            response = self.session.get(search_url, params=params, timeout=HTTP_TIMEOUT)
+            data = _json_loads(response.content)
             
             if data.get('status') != 'OK' and data.get('status') != 'ZERO_RESULTS':
                 print(f"⚠️ Google Places API error: {data.get('status')}")
@@ -687,65 +1244,12 @@ class GooglePlacesDiscovery:
             places = data.get('results', [])
             print(f"✅ Found {len(places)} places in initial search")
             
-            # Get details for each place
-            for place in places[:max_results]:
-                place_id = place.get('place_id')
-                if not place_id:
-                    continue
-                
-                # Get place details
-                details_url = f"{self.BASE_URL}/details/json"
-                details_params = {
-                    'place_id': place_id,
-                    'fields': 'name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,price_level,business_status,types,url',
-                    'key': self.api_key
-                }
-                
-                details_response = requests.get(details_url, params=details_params)
-                details_data = details_response.json()
-                
-                if details_data.get('status') == 'OK':
-                    result = details_data.get('result', {})
-                    
-                    # Extract location components
-                    address = result.get('formatted_address', '')
-                    country = self._extract_country(address)
-                    
-                    # Get business types
-                    types = result.get('types', [])
-                    primary_type = self._get_primary_business_type(types)
-                    
-                    # Try to find Facebook URL from website (if any)
-                    facebook_url = self._find_facebook_url(result.get('website', ''))
-                    
-                    # Ensure rating is not None
-                    rating = result.get('rating', 0)
-                    if rating is None:
-                        rating = 0
-                    
-                    business = {
-                        'name': result.get('name', place.get('name', '')),
-                        'company': result.get('name', place.get('name', '')),
-                        'address': address,
-                        'location': address,
-                        'country': country,
-                        'phone': self._format_phone_for_whatsapp(result.get('formatted_phone_number', '')),
-                        'website': result.get('website', ''),
-                        'email': '',  # Email not available from Places API
-                        'facebook_url': facebook_url,
-                        'industry': primary_type,
-                        'place_id': place_id,
-                        'rating': rating,
-                        'total_ratings': result.get('user_ratings_total', 0),
-                        'price_level': result.get('price_level', 0),
-                        'business_status': result.get('business_status', ''),
-                        'types': ','.join(types[:5]),
-                        'google_maps_url': result.get('url', ''),
-                        'source': LeadSource.GOOGLE_PLACES.value
-                    }
-                    
-                    businesses.append(business)
-                    time.sleep(0.1)
+            # Place Details calls are independent, so overlap their latency
+            # Text Search already carries the rating, so under-rated places never cost a details call
+            if min_rating > 0:
+                places = [p for p in places if (p.get('rating') or 0) >= min_rating]
+            details = PLACES_DETAILS_POOL.map(self._place_details, places[:max_results])
+            businesses = [b for b in details if b]
             
             print(f"✅ Google Places: Found {len(businesses)} businesses with details")
             
@@ -756,6 +1260,121 @@ class GooglePlacesDiscovery:
         
         return businesses
     
+    def _search_text(self, search_text: str, max_results: int, min_rating: float = 0.0) -> Optional[List[Dict]]:
+        """Search via Places API (New); None if the key can't use it, so callers fall back"""
+        PLACES_RATE_LIMIT.acquire()
+        response = self.session.post(
+            self.SEARCH_TEXT_URL,
+            # Ask for a full page when filtering, so max_results can still be met
+            json={'textQuery': search_text, 'maxResultCount': 20 if min_rating > 0 else max(1, min(max_results, 20))},
+            headers={'X-Goog-Api-Key': self.api_key, 'X-Goog-FieldMask': self.SEARCH_TEXT_FIELDS},
+            timeout=HTTP_TIMEOUT
+        )
+        data = _json_loads(response.content)
+        
+        if response.status_code != 200:
+            status = data.get('error', {}).get('status', response.status_code)
+            if status in ('PERMISSION_DENIED', 403):
+                # Places API (New) isn't enabled for this key; stick with the legacy API
+                print("⚠️ Places API (New) not enabled for this key, using legacy Places API")
+                self.use_search_text = False
+            else:
+                print(f"⚠️ Google Places API error: {status}")
+            return None
+        
+        places = data.get('places', [])
+        if min_rating > 0:
+            places = [p for p in places if (p.get('rating') or 0) >= min_rating]
+        return [self._business_from_place(place) for place in places[:max_results]]
+    
+    def _business_from_place(self, place: Dict) -> Dict:
+        """Map a Places API (New) place to the same business dict as _place_details"""
+        name = place.get('displayName', {}).get('text', '')
+        address = place.get('formattedAddress', '')
+        types = place.get('types', [])
+        return {
+            'name': name,
+            'company': name,
+            'address': address,
+            'location': address,
+            'country': self._extract_country(address),
+            'phone': self._format_phone_for_whatsapp(place.get('nationalPhoneNumber', '')),
+            'website': place.get('websiteUri', ''),
+            'email': '',  # Email not available from Places API
+            'facebook_url': self._find_facebook_url(place.get('websiteUri', '')),
+            'industry': self._get_primary_business_type(types),
+            'place_id': place.get('id', ''),
+            'rating': place.get('rating') or 0,
+            'total_ratings': place.get('userRatingCount', 0),
+            'price_level': self.PRICE_LEVELS.get(place.get('priceLevel'), 0),
+            'business_status': place.get('businessStatus', ''),
+            'types': ','.join(types[:5]),
+            'google_maps_url': place.get('googleMapsUri', ''),
+            'source': LeadSource.GOOGLE_PLACES.value
+        }
+    
+    def _place_details(self, place: Dict) -> Optional[Dict]:
+        """Fetch Place Details for one text-search hit and map it to a business dict"""
+        place_id = place.get('place_id')
+        if not place_id:
+            return None
+        
+        details_url = f"{self.BASE_URL}/details/json"
+        details_params = {
+            'place_id': place_id,
+            'fields': 'name,formatted_address,formatted_phone_number,website,rating,user_ratings_total,price_level,business_status,types,url',
+            'key': self.api_key
+        }
+        
+        try:
+            PLACES_RATE_LIMIT.acquire()
+            details_data = _json_loads(self.session.get(details_url, params=details_params, timeout=HTTP_TIMEOUT).content)
+        except Exception as e:
+            print(f"⚠️ Google Places details failed for {place_id}: {e}")
+            return None
+        
+        if details_data.get('status') != 'OK':
+            return None
+        
+        result = details_data.get('result', {})
+        
+        # Extract location components
+        address = result.get('formatted_address', '')
+        country = self._extract_country(address)
+        
+        # Get business types
+        types = result.get('types', [])
+        primary_type = self._get_primary_business_type(types)
+        
+        # Try to find Facebook URL from website (if any)
+        facebook_url = self._find_facebook_url(result.get('website', ''))
+        
+        # Ensure rating is not None
+        rating = result.get('rating', 0)
+        if rating is None:
+            rating = 0
+        
+        return {
+            'name': result.get('name', place.get('name', '')),
+            'company': result.get('name', place.get('name', '')),
+            'address': address,
+            'location': address,
+            'country': country,
+            'phone': self._format_phone_for_whatsapp(result.get('formatted_phone_number', '')),
+            'website': result.get('website', ''),
+            'email': '',  # Email not available from Places API
+            'facebook_url': facebook_url,
+            'industry': primary_type,
+            'place_id': place_id,
+            'rating': rating,
+            'total_ratings': result.get('user_ratings_total', 0),
+            'price_level': result.get('price_level', 0),
+            'business_status': result.get('business_status', ''),
+            'types': ','.join(types[:5]),
+            'google_maps_url': result.get('url', ''),
+            'source': LeadSource.GOOGLE_PLACES.value
+        }
+    
     def _format_phone_for_whatsapp(self, phone: str) -> str:
         """Format phone number for WhatsApp (remove non-digits)"""
         if not phone:
@@ -773,7 +1392,8 @@ class GooglePlacesDiscovery:
             return ''
         
         # If the website itself is Facebook
-        if 'facebook.com' in website.lower():
+        host = _url_host(website)
+        if host == 'facebook.com' or host.endswith('.facebook.com'):
             return website
         
         # In a real implementation, you might scrape the website or use other APIs
@@ -789,9 +1409,8 @@ class GooglePlacesDiscovery:
     
     def _get_primary_business_type(self, types: List[str]) -> str:
         """Get the primary business type from types list"""
-        exclude = ['establishment', 'point_of_interest', 'food', 'store']
         for t in types:
-            if t not in exclude and '_' not in t:
+            if t not in self.GENERIC_TYPES and '_' not in t:
                 return t.replace('_', ' ').title()
         return types[0].replace('_', ' ').title() if types else 'Business'
 
@@ -799,14 +1418,32 @@ class GooglePlacesDiscovery:
 # MESSAGE SERVICE (Multi-channel)
 # ============================================================================
 
+@functools.lru_cache(maxsize=64)
+def _format_sender(name: str, address: str) -> str:
+    """From header, RFC 2047-encoded if the name isn't ASCII; the same for a whole campaign"""
+    return formataddr((name, address))
+
+# [Placeholder] tokens in campaign templates, substituted in one pass per message
+_PLACEHOLDER_RE = re.compile(r'\[(Name|Company|Industry|Location|Rating)\]')
+
+def _fill_placeholders(template: str, values: Dict[str, str]) -> str:
+    """Replace the [Placeholder]s present in values; any others are left as written"""
+    return _PLACEHOLDER_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
 class MessageService:
-    def __init__(self):
+    def __init__(self, session: requests.Session = None):
+        self.session = session or HTTP_SESSION
+
         # Email settings
         self.smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.smtp_user = os.getenv("SMTP_USER", "")
         self.smtp_password = os.getenv("SMTP_PASSWORD", "")
         
+        # One logged-in SMTP session shared across sends; smtplib isn't thread-safe
+        self._smtp = None
+        self._smtp_lock = RLock()
+        
         # Simulation mode
         self.simulation_mode = not all([self.smtp_user, self.smtp_password])
         if self.simulation_mode:
@@ -819,22 +1456,76 @@ class MessageService:
             return True
         
         try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{from_name} <{self.smtp_user}>"
+            # A single text/plain part; no multipart container to build and serialize
+            msg = MIMEText(body, 'plain')
+            msg['From'] = _format_sender(from_name, self.smtp_user)
             msg['To'] = to_email
             msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
             
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
+            with self._smtp_lock:
+                try:
+                    self._get_smtp().send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Server dropped the idle session; reconnect once
+                    self._smtp = None
+                    self._get_smtp().send_message(msg)
             return True
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            # Only this message was refused; other jobs keep using the session
+            print(f"❌ Email failed: {e}")
+            return False
+        except OSError as e:
+            # Connection-level failure (smtplib errors are OSErrors too)
+            print(f"❌ Email failed: {e}")
+            self.close_smtp()
+            return False
         except Exception as e:
             print(f"❌ Email failed: {e}")
             return False
     
+    def _get_smtp(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            # Bounded, since every sender waits on this under _smtp_lock
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+            server.starttls()
+            server.login(self.smtp_user, self.smtp_password)
+            self._smtp = server
+        return self._smtp
+    
+    def close_smtp(self):
+        """Log out of the shared SMTP session, if one is open"""
+        with self._smtp_lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._smtp = None
+    
+    # Pause (min, max seconds) between messages of a batch. Email reuses one
+    # SMTP session so needs none; the chat APIs get a randomized gap.
+    BATCH_DELAYS = {
+        ChannelType.WHATSAPP.value: (1, 3),
+        ChannelType.FACEBOOK.value: (1, 3),
+    }
+
+    def send_batch(self, leads: List[Lead], campaign: Campaign, channel: str,
+                   user_settings: User) -> Iterator[Tuple[Lead, Optional[MessageRecord]]]:
+        """Send to each lead in turn over one SMTP session, yielding (lead, message or None)"""
+        delay = self.BATCH_DELAYS.get(channel)
+        try:
+            for i, lead in enumerate(leads):
+                if delay and i:
+                    time.sleep(random.uniform(*delay))
+                try:
+                    message = self.send_campaign_message(lead, campaign, channel, user_settings)
+                except Exception as e:
+                    print(f"Error sending message to {lead.lead_id}: {e}")
+                    message = None
+                yield lead, message
+        finally:
+            self.close_smtp()
+
     def send_whatsapp(self, to_phone: str, message: str, twilio_settings: Dict = None) -> bool:
         """
         Send WhatsApp message via Twilio
@@ -901,8 +1592,8 @@ class MessageService:
                 "access_token": page_token
             }
             
-            response = requests.post(url, json=payload)
-            data = response.json()
+            response = self.session.post(url, json=payload, timeout=HTTP_TIMEOUT)
+            data = _json_loads(response.content)
             
             return 'message_id' in data
             
@@ -919,8 +1610,8 @@ class MessageService:
                 "access_token": page_token
             }
             
-            response = requests.post(url, params=params)
-            data = response.json()
+            response = self.session.post(url, params=params, timeout=HTTP_TIMEOUT)
+            data = _json_loads(response.content)
             
             return 'id' in data
             
@@ -943,24 +1634,20 @@ class MessageService:
     def send_campaign_message(self, lead: Lead, campaign: Campaign, channel: str, user_settings: User) -> Optional[MessageRecord]:
         """Send a message via specified channel"""
         
-        message_id = f"msg_{int(time.time())}_{lead.lead_id}_{channel}"
+        message_id = f"msg_{uuid4().hex}"
         timestamp = datetime.datetime.now().isoformat()
+        rating = str(lead.rating) if lead.rating and lead.rating > 0 else ""
         
         # Prepare content based on channel
         if channel == ChannelType.EMAIL.value:
-            content = campaign.email_body
-            subject = campaign.email_subject
-            
             # Replace placeholders
-            content = content.replace("[Name]", lead.name)
-            content = content.replace("[Company]", lead.company)
-            content = content.replace("[Industry]", lead.industry or "")
-            content = content.replace("[Location]", lead.location or "")
-            rating = str(lead.rating) if lead.rating and lead.rating > 0 else ""
-            content = content.replace("[Rating]", rating)
-            
-            subject = subject.replace("[Name]", lead.name)
-            subject = subject.replace("[Company]", lead.company)
+            content = _fill_placeholders(campaign.email_body, {
+                'Name': lead.name, 'Company': lead.company or "",
+                'Industry': lead.industry or "", 'Location': lead.location or "", 'Rating': rating
+            })
+            subject = _fill_placeholders(campaign.email_subject, {
+                'Name': lead.name, 'Company': lead.company or ""
+            })
             
             # For email, combine subject and body
             full_content = f"Subject: {subject}\n\n{content}"
@@ -974,14 +1661,11 @@ class MessageService:
             )
             
         elif channel == ChannelType.WHATSAPP.value:
-            content = campaign.whatsapp_template
-            
             # Replace placeholders
-            content = content.replace("[Name]", lead.name.split()[0])  # First name only
-            content = content.replace("[Company]", lead.company)
-            content = content.replace("[Industry]", lead.industry or "")
-            rating = str(lead.rating) if lead.rating and lead.rating > 0 else ""
-            content = content.replace("[Rating]", rating)
+            content = _fill_placeholders(campaign.whatsapp_template, {
+                'Name': lead.name.split()[0],  # First name only
+                'Company': lead.company or "", 'Industry': lead.industry or "", 'Rating': rating
+            })
             
             full_content = content
             
@@ -996,14 +1680,11 @@ class MessageService:
             success = self.send_whatsapp(lead.phone, content, twilio_settings)
             
         elif channel == ChannelType.FACEBOOK.value:
-            content = campaign.facebook_template
-            
             # Replace placeholders
-            content = content.replace("[Name]", lead.name.split()[0])
-            content = content.replace("[Company]", lead.company)
-            content = content.replace("[Industry]", lead.industry or "")
-            rating = str(lead.rating) if lead.rating and lead.rating > 0 else ""
-            content = content.replace("[Rating]", rating)
+            content = _fill_placeholders(campaign.facebook_template, {
+                'Name': lead.name.split()[0],
+                'Company': lead.company or "", 'Industry': lead.industry or "", 'Rating': rating
+            })
             
             full_content = content
             
@@ -1048,18 +1729,23 @@ class MessageService:
 # ============================================================================
 
 class BusinessDiscovery:
-    def __init__(self):
+    # Each search also fans out its own Place Details calls
+    SEARCH_CONCURRENCY = 3
+    
+    def __init__(self, session: requests.Session = None):
+        self.session = session or HTTP_SESSION
         self.google_places = None
     
     def _init_google_places(self, api_key: str):
         if not self.google_places:
-            self.google_places = GooglePlacesDiscovery(api_key)
+            self.google_places = GooglePlacesDiscovery(api_key, session=self.session)
         else:
             self.google_places.set_api_key(api_key)
         return self.google_places.authenticated
     
-    def discover_businesses(self, campaign: Campaign, user_api_key: str = None, max_businesses: int = 50) -> List[Dict]:
-        """Discover businesses using Google Places API"""
+    def discover_businesses(self, campaign: Campaign, user_api_key: str = None, max_businesses: int = 50,
+                            known_place_ids: set = None) -> List[Dict]:
+        """Discover businesses using Google Places API, skipping places in known_place_ids"""
         if not campaign.search_queries:
             print("❌ No search queries defined")
             return []
@@ -1073,34 +1759,33 @@ class BusinessDiscovery:
             return []
         
         all_businesses = []
-        seen_place_ids = set()
+        seen_place_ids = set(known_place_ids or ())
         
         try:
-            for query in campaign.search_queries[:3]:
-                locations = campaign.search_locations if campaign.search_locations else ['']
+            locations = campaign.search_locations if campaign.search_locations else ['']
+            searches = [(query, location)
+                        for query in campaign.search_queries[:3]
+                        for location in locations[:3]
+                        if query or location]
+            per_search = min(campaign.max_results_per_search or 20, max_businesses, 20)
+            
+            def run_search(search):
+                query, location = search
+                print(f"\n🔍 Searching: '{query}' in '{location or 'any location'}'")
+                return self.google_places.search_places(
+                    query=query,
+                    location=location,
+                    max_results=per_search,
+                    min_rating=campaign.min_rating
+                )
+            
+            # Searches are independent; run them together and merge in query order.
+            # Once max_businesses is reached, searches that haven't started are cancelled.
+            pool = ThreadPoolExecutor(max_workers=self.SEARCH_CONCURRENCY)
+            try:
+                results = pool.map(run_search, searches)
                 
-                for location in locations[:3]:
-                    if not location and not query:
-                        continue
-                    
-                    print(f"\n🔍 Searching: '{query}' in '{location or 'any location'}'")
-                    
-                    remaining = max_businesses - len(all_businesses)
-                    if remaining <= 0:
-                        break
-                    
-                    per_search = min(
-                        campaign.max_results_per_search or 20,
-                        remaining,
-                        20
-                    )
-                    
-                    businesses = self.google_places.search_places(
-                        query=query,
-                        location=location,
-                        max_results=per_search
-                    )
-                    
+                for (query, _), businesses in zip(searches, results):
                     for biz in businesses:
                         place_id = biz.get('place_id')
                         if place_id and place_id not in seen_place_ids:
@@ -1117,10 +1802,10 @@ class BusinessDiscovery:
                             if len(all_businesses) >= max_businesses:
                                 break
                     
-                    time.sleep(1)
-                    
-                if len(all_businesses) >= max_businesses:
-                    break
+                    if len(all_businesses) >= max_businesses:
+                        break
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
             
             print(f"\n✅ Total unique businesses found: {len(all_businesses)}")
             
@@ -1146,54 +1831,137 @@ class BusinessDiscovery:
 # LEAD PROCESSOR
 # ============================================================================
 
+@functools.lru_cache(maxsize=256)
+def _term_matcher(terms: tuple):
+    """Case-insensitive 'any term is a substring' test, compiled once per campaign term list"""
+    return re.compile('|'.join(map(re.escape, terms)), re.IGNORECASE).search
+
 class LeadProcessor:
+    # Lead field <- accepted CSV headers (matched case-insensitively), in priority order
+    CSV_FIELDS = (
+        ('name', ('name',)),
+        ('company', ('company',)),
+        ('email', ('email',)),
+        ('phone', ('phone', 'whatsapp')),
+        ('facebook_url', ('facebook',)),
+        ('website', ('website',)),
+        ('industry', ('industry',)),
+        ('location', ('location',)),
+        ('country', ('country',)),
+        ('timezone', ('timezone',)),
+        ('notes', ('notes',)),
+        ('linkedin_url', ('linkedin',)),
+        ('job_title', ('job_title', 'job title')),
+    )
+
     @staticmethod
-    def import_from_csv(content: str, campaign_id: str, user_id: str) -> List[Lead]:
-        leads = []
-        reader = csv.DictReader(content.splitlines())
-        for i, row in enumerate(reader):
-            email = row.get('email', row.get('Email', '') or '').strip().lower()
-            phone = row.get('phone', row.get('Phone', row.get('whatsapp', '')) or '').strip()
-            phone = re.sub(r'\D', '', phone)  # Clean phone number
+    def import_from_csv(lines: Iterable[str], campaign_id: str, user_id: str) -> Iterator[Lead]:
+        """Yield Leads row by row from CSV lines (a text file object or any iterable of lines)"""
+        reader = csv.DictReader(lines)
+        # Resolve each Lead field to its CSV header once, not per row
+        headers = {h.strip().lower(): h for h in reversed(reader.fieldnames or [])}
+        columns = [(target, next((headers[a] for a in aliases if a in headers), None))
+                   for target, aliases in LeadProcessor.CSV_FIELDS]
+        
+        for row in reader:
+            values = {target: (row[header] or '') if header else '' for target, header in columns}
+            email = values['email'].strip().lower()
+            values['email'] = email if EMAIL_RE.fullmatch(email) else ''
+            values['phone'] = re.sub(r'\D', '', values['phone'])  # Clean phone number
+            values['name'] = values['name'] or 'Unknown'
+            values['country'] = _intern(values['country'])
+            values['industry'] = _intern(values['industry'])
+            now = datetime.datetime.now().isoformat()
             
-            lead = Lead(
-                lead_id=f"lead_{int(time.time())}_{i}_{random.randint(1000,9999)}",
+            yield Lead(
+                lead_id=f"lead_{uuid4().hex}",
                 campaign_id=campaign_id,
                 user_id=user_id,
-                name=row.get('name', row.get('Name', 'Unknown')) or 'Unknown',
-                company=row.get('company', row.get('Company', '')) or '',
-                email=email,
-                phone=phone,
-                facebook_url=row.get('facebook', row.get('Facebook', '')) or '',
-                website=row.get('website', row.get('Website', '')) or '',
-                industry=row.get('industry', row.get('Industry', '')) or '',
-                location=row.get('location', row.get('Location', '')) or '',
-                country=row.get('country', row.get('Country', '')) or '',
-                timezone=row.get('timezone', row.get('Timezone', '')) or '',
-                notes=row.get('notes', row.get('Notes', '')) or '',
-                linkedin_url=row.get('linkedin', row.get('LinkedIn', '')) or '',
-                job_title=row.get('job_title', row.get('Job Title', '')) or '',
                 source=LeadSource.CSV.value,
                 status=LeadStatus.PENDING.value,
-                created_at=datetime.datetime.now().isoformat(),
-                updated_at=datetime.datetime.now().isoformat()
+                created_at=now,
+                updated_at=now,
+                **values
             )
-            leads.append(lead)
-        return leads
+
+    # Lead field <- discovery dict keys; the first non-empty key wins
+    BUSINESS_FIELDS = (
+        ('name', ('name',)),
+        ('company', ('company', 'name')),
+        ('email', ('email',)),
+        ('phone', ('phone',)),
+        ('facebook_url', ('facebook_url',)),
+        ('website', ('website',)),
+        ('industry', ('industry',)),
+        ('location', ('location',)),
+        ('country', ('country',)),
+        ('place_id', ('place_id',)),
+        ('business_status', ('business_status',)),
+        ('types', ('types',)),
+    )
+
+    @staticmethod
+    def lead_from_business(biz: Dict, campaign_id: str, user_id: str,
+                           source: str, industry: str = '') -> Lead:
+        """Build a Lead from a discovered/searched business dict"""
+        values = {target: next((biz[k] for k in keys if biz.get(k)), '')
+                  for target, keys in LeadProcessor.BUSINESS_FIELDS}
+        values['name'] = values['name'] or 'Contact'
+        values['company'] = values['company'] or 'Unknown'
+        values['industry'] = _intern(values['industry'] or industry)
+        values['country'] = _intern(values['country'])
+        values['business_status'] = _intern(values['business_status'])
+        now = datetime.datetime.now().isoformat()
+        return Lead(
+            lead_id=f"lead_{uuid4().hex}",
+            campaign_id=campaign_id,
+            user_id=user_id,
+            rating=biz.get('rating') or 0,
+            total_ratings=biz.get('total_ratings') or 0,
+            price_level=biz.get('price_level') or 0,
+            source=source,
+            status=LeadStatus.PENDING.value,
+            created_at=now,
+            updated_at=now,
+            **values
+        )
 
     @staticmethod
     def score_lead(lead: Lead, campaign: Campaign) -> int:
+        """Score a lead 0-100 against the campaign's criteria.
+
+        Deliberately plain Python, not Numba: the work is substring matching
+        and truthiness checks on str fields, which njit handles poorly and
+        whose compile cost would outweigh a per-lead call. Revisit with
+        @numba.njit(cache=True) only if scoring moves to numeric features.
+        """
+        return LeadProcessor._score(lead, *LeadProcessor._campaign_matchers(campaign))
+
+    @staticmethod
+    def score_leads(leads: Iterable[Lead], campaign: Campaign):
+        """Set qualification_score on each lead, resolving the campaign's matchers once"""
+        industry_match, location_match = LeadProcessor._campaign_matchers(campaign)
+        for lead in leads:
+            lead.qualification_score = LeadProcessor._score(lead, industry_match, location_match)
+
+    @staticmethod
+    def _campaign_matchers(campaign: Campaign) -> tuple:
+        return (
+            _term_matcher(tuple(campaign.ideal_industries)) if campaign.ideal_industries else None,
+            _term_matcher(tuple(campaign.search_locations)) if campaign.search_locations else None,
+        )
+
+    @staticmethod
+    def _score(lead: Lead, industry_match, location_match) -> int:
         score = 0
         
         # Industry match
-        if campaign.ideal_industries and lead.industry:
-            if any(i.lower() in lead.industry.lower() for i in campaign.ideal_industries):
-                score += 30
+        if industry_match and lead.industry and industry_match(lead.industry):
+            score += 30
         
         # Location match
-        if campaign.search_locations and lead.location:
-            if any(l.lower() in lead.location.lower() for l in campaign.search_locations):
-                score += 20
+        if location_match and lead.location and location_match(lead.location):
+            score += 20
         
         # Rating score (handle None)
         rating = lead.rating if lead.rating is not None else 0
@@ -1250,16 +2018,36 @@ class AnalyticsEngine:
                 'total_failed': 0
             }
         
-        leads = db.get_campaign_leads(user_id, campaign_id)
-        total = len(leads)
-        
-        # Safe handling of message stats
-        messages = []
-        for lead in leads:
-            try:
-                messages.extend(db.get_lead_messages(lead.lead_id))
-            except:
-                pass
+        return AnalyticsEngine._build_stats(
+            campaign.name,
+            db.get_campaign_lead_stats(user_id, campaign_id),
+            db.get_campaign_message_stats(user_id, campaign_id),
+            db.get_campaign_country_counts(user_id, campaign_id)
+        )
+
+    # Aggregates of a campaign without any leads
+    EMPTY_LEAD_STATS = {
+        'total': 0, 'hot': 0, 'cold': 0, 'with_email': 0, 'with_phone': 0,
+        'with_facebook': 0, 'with_website': 0, 'avg_rating': None
+    }
+
+    @staticmethod
+    def get_all_campaign_stats(db: Database, user_id: str, campaigns: List[Campaign]) -> Dict[str, Dict]:
+        """get_campaign_stats for all the user's campaigns from three (cached) grouped queries, keyed by campaign_id"""
+        lead_stats, message_stats, countries = db.get_user_stats_rows(user_id)
+        return {
+            c.campaign_id: AnalyticsEngine._build_stats(
+                c.name,
+                lead_stats.get(c.campaign_id, AnalyticsEngine.EMPTY_LEAD_STATS),
+                message_stats.get(c.campaign_id, []),
+                countries.get(c.campaign_id, [])
+            )
+            for c in campaigns
+        }
+
+    @staticmethod
+    def _build_stats(campaign_name: str, lead_stats: Dict, message_rows: List[Dict], countries: List[tuple]) -> Dict:
+        total = lead_stats['total']
         
         # Message stats by channel with safe defaults
         channel_stats = {
@@ -1267,51 +2055,22 @@ class AnalyticsEngine:
             'whatsapp': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0},
             'facebook': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0}
         }
+        total_messages = 0
         
-        for msg in messages:
-            channel = msg.channel if hasattr(msg, 'channel') and msg.channel else 'email'
-            if channel not in channel_stats:
-                channel = 'email'
-            
-            if msg.status == MessageStatus.SENT.value:
-                channel_stats[channel]['sent'] += 1
-            elif msg.status == MessageStatus.FAILED.value:
-                channel_stats[channel]['failed'] += 1
-            
-            if hasattr(msg, 'read_at') and msg.read_at:
-                channel_stats[channel]['read'] += 1
-            if hasattr(msg, 'replied_at') and msg.replied_at:
-                channel_stats[channel]['replied'] += 1
+        for row in message_rows:
+            channel = row['channel'] if row['channel'] in channel_stats else 'email'
+            for key in ('sent', 'failed', 'read', 'replied'):
+                channel_stats[channel][key] += row[key]
+            total_messages += row['total']
         
         # Lead stats
-        hot = len([l for l in leads if l.status == LeadStatus.QUALIFIED_HOT.value])
-        cold = len([l for l in leads if l.status == LeadStatus.COLD.value])
-        
-        # Contact availability (handle None values)
-        with_email = len([l for l in leads if l.email and str(l.email).strip()])
-        with_phone = len([l for l in leads if l.phone and str(l.phone).strip()])
-        with_facebook = len([l for l in leads if l.facebook_url and str(l.facebook_url).strip()])
-        with_website = len([l for l in leads if l.website and str(l.website).strip()])
+        hot = lead_stats['hot']
+        cold = lead_stats['cold']
         
-        # Average rating - FIXED: Handle None values
-        valid_ratings = []
-        for l in leads:
-            rating = l.rating
-            if rating is not None and isinstance(rating, (int, float)) and rating > 0:
-                valid_ratings.append(float(rating))
-        
-        avg_rating = sum(valid_ratings) / len(valid_ratings) if valid_ratings else 0
-
-        # Country breakdown
-        countries = {}
-        for l in leads:
-            if l.country and str(l.country).strip():
-                country = str(l.country).strip()
-                countries[country] = countries.get(country, 0) + 1
-        
-        # Sort countries by count and take top 5
-        sorted_countries = sorted(countries.items(), key=lambda x: x[1], reverse=True)[:5]
-        country_str = "\n".join(f"{c}: {v}" for c, v in sorted_countries)
+        avg_rating = lead_stats['avg_rating'] or 0
+
+        # Country breakdown, top 5
+        country_str = "\n".join(f"{c}: {v}" for c, v in countries[:5])
 
         # Calculate total sent messages - FIXED: No sum() on integer
         total_sent = (
@@ -1327,7 +2086,7 @@ class AnalyticsEngine:
         )
 
         return {
-            'campaign_name': campaign.name,
+            'campaign_name': campaign_name,
             'total_leads': total,
             'hot_leads': hot,
             'cold_leads': cold,
@@ -1337,32 +2096,106 @@ class AnalyticsEngine:
             'countries_found': len(countries),
             'country_breakdown': country_str,
             'contact_availability': {
-                'email': with_email,
-                'phone': with_phone,
-                'facebook': with_facebook,
-                'website': with_website
+                'email': lead_stats['with_email'],
+                'phone': lead_stats['with_phone'],
+                'facebook': lead_stats['with_facebook'],
+                'website': lead_stats['with_website']
             },
             'channel_stats': channel_stats,
-            'total_messages': len(messages)
+            'total_messages': total_messages
         }
 
 # ============================================================================
 # FLASK APP
 # ============================================================================
 
+def load_or_create_secret_key(path: Path = Path(__file__).parent / '.secret_key') -> str:
+    """Read the session signing key from `path`, generating it on first start"""
+    key = secrets.token_hex(32)
+    try:
+        # O_EXCL: when several workers start together exactly one creates the
+        # file; owner-only, so the key isn't readable by other users on the box
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        try:
+            # The creating worker may not have written the key yet
+            for _ in range(50):
+                with open(path) as f:
+                    existing = f.read().strip()
+                if existing:
+                    return existing
+                time.sleep(0.1)
+            print(f"⚠️ {path} is empty; using a temporary secret key")
+        except OSError as e:
+            print(f"⚠️ Could not read {path} ({e}); using a temporary secret key")
+        return key
+    except OSError as e:
+        print(f"⚠️ Could not create {path} ({e}); using a temporary secret key")
+        return key
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
 app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", secrets.token_hex(16))
+# A persisted key keeps sessions valid across restarts
+app.secret_key = os.getenv("SECRET_KEY") or load_or_create_secret_key()
 CORS(app)
 
+# Template caching: no per-request stat() checks outside debug, a larger
+# in-memory template cache, and compiled bytecode persisted across restarts
+DEBUG = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+JINJA_CACHE_DIR = Path(os.environ.get('JINJA_CACHE_DIR', Path(__file__).parent / '.jinja_cache'))
+JINJA_CACHE_DIR.mkdir(exist_ok=True)
+app.config['TEMPLATES_AUTO_RELOAD'] = DEBUG
+
+if orjson:
+    app.json = OrjsonProvider(app)
+app.jinja_options = {
+    'cache_size': 400,
+    'bytecode_cache': FileSystemBytecodeCache(str(JINJA_CACHE_DIR)),
+}
+
 db = Database()
 message_service = MessageService()
 business_discovery = BusinessDiscovery()
 analytics = AnalyticsEngine()
 
+# Sent messages are written to the DB in batches of this size
+SEND_FLUSH_EVERY = 10
+# CSV imports are saved in batches of this many leads
+IMPORT_BATCH_SIZE = 5000
+
+# Discovery and sending jobs run here, so a burst of requests queues up
+# instead of starting an unbounded number of threads
+BACKGROUND_JOBS = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background')
+
+def run_in_background(func, *args):
+    """Queue a job on BACKGROUND_JOBS, logging anything it raises"""
+    def report(future):
+        if future.exception():
+            print(f"❌ Background job {func.__name__} failed: {future.exception()}")
+    BACKGROUND_JOBS.submit(func, *args).add_done_callback(report)
+
 # ============================================================================
 # AUTH ROUTES
 # ============================================================================
 
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(password)
+
+def verify_password(user: User, password: str) -> bool:
+    """Check a login attempt, upgrading legacy plaintext rows to a hash"""
+    stored = user.password_hash or ''
+    password = password or ''
+    if stored.startswith(HASH_PREFIXES):
+        return check_password_hash(stored, password)
+    if stored and hmac.compare_digest(stored.encode(), password.encode()):
+        db.update_user(user.user_id, password_hash=hash_password(password))
+        return True
+    return False
+
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -1374,7 +2207,7 @@ def login():
     username = request.form.get('username')
     password = request.form.get('password')
     user = db.get_user_by_username(username)
-    if user and user.password_hash == password:
+    if user and verify_password(user, password):
         session['user_id'] = user.user_id
         session['username'] = user.username
         flash('Login successful!', 'success')
@@ -1394,7 +2227,7 @@ def register():
         user = User(
             user_id=f"user_{int(time.time())}",
             username=username,
-            password_hash=password,
+            password_hash=hash_password(password),
             email=email,
             created_at=datetime.datetime.now().isoformat()
         )
@@ -1491,27 +2324,23 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('index'))
     
-    user = db.get_user(session['user_id'])
     campaigns = db.get_user_campaigns(session['user_id'])
-    stats = []
-    
-    for c in campaigns:
-        try:
-            campaign_stats = analytics.get_campaign_stats(db, session['user_id'], c.campaign_id)
-            stats.append(campaign_stats)
-        except Exception as e:
-            print(f"Error getting stats for campaign {c.campaign_id}: {e}")
-            # Append empty stats to maintain order
-            stats.append({
-                'campaign_name': c.name,
-                'total_leads': 0,
-                'emails_sent': 0,
-                'hot_leads': 0,
-                'avg_rating': 0,
-                'total_sent': 0
-            })
-    
-    return render_template('dashboard.html', campaigns=campaigns, stats=stats, user=user)
+    try:
+        stats_by_id = analytics.get_all_campaign_stats(db, session['user_id'], campaigns)
+    except Exception as e:
+        print(f"Error getting campaign stats: {e}")
+        stats_by_id = {}
+    # Empty stats for any campaign that failed, to maintain order
+    stats = [stats_by_id.get(c.campaign_id) or {
+        'campaign_name': c.name,
+        'total_leads': 0,
+        'emails_sent': 0,
+        'hot_leads': 0,
+        'avg_rating': 0,
+        'total_sent': 0
+    } for c in campaigns]
+    
+    return render_template('dashboard.html', campaigns=campaigns, stats=stats)
 
 # ============================================================================
 # CAMPAIGN MANAGEMENT
@@ -1600,15 +2429,34 @@ def import_leads(campaign_id):
         flash('Please upload a CSV file', 'error')
         return redirect(url_for('campaign_detail', campaign_id=campaign_id))
     
-    content = file.read().decode('utf-8')
-    leads = LeadProcessor.import_from_csv(content, campaign_id, session['user_id'])
     campaign = db.get_campaign(campaign_id)
     
-    for lead in leads:
-        lead.qualification_score = LeadProcessor.score_lead(lead, campaign)
-    
-    db.save_leads(session['user_id'], campaign_id, leads)
-    flash(f'Imported {len(leads)} leads', 'success')
+    # Read the upload as it streams in and save in batches, so memory stays
+    # bounded by the batch size rather than the file size
+    lines = io.TextIOWrapper(file.stream, encoding='utf-8', newline='')
+    imported = 0
+    batch = []
+    error = None
+    try:
+        for lead in LeadProcessor.import_from_csv(lines, campaign_id, session['user_id']):
+            batch.append(lead)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                LeadProcessor.score_leads(batch, campaign)
+                db.save_leads(session['user_id'], campaign_id, batch)
+                imported += len(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Earlier batches are already saved; keep the rows read before the
+        # bad one too, and tell the user where to resume
+        error = e
+    LeadProcessor.score_leads(batch, campaign)
+    db.save_leads(session['user_id'], campaign_id, batch)
+    imported += len(batch)
+    if error:
+        flash(f'Imported the first {imported} leads, then stopped on an unreadable row '
+              f'({error}). Fix the file and upload only the rows after those.', 'error')
+    else:
+        flash(f'Imported {imported} leads', 'success')
     return redirect(url_for('campaign_detail', campaign_id=campaign_id))
 
 @app.route('/campaign/<campaign_id>/discover-businesses', methods=['POST'])
@@ -1627,52 +2475,29 @@ def discover_businesses_route(campaign_id):
     flash('Starting business discovery...', 'success')
 
     def discover(uid, cid, campaign, api_key):
+        # Re-running discovery shouldn't re-add places the campaign already has
         discovered = business_discovery.discover_businesses(
             campaign, 
             user_api_key=api_key, 
-            max_businesses=campaign.max_results or 50
+            max_businesses=campaign.max_results or 50,
+            known_place_ids=db.get_campaign_place_ids(uid, cid)
         )
         
-        leads = []
-        for i, biz in enumerate(discovered):
-            # Ensure rating is not None
-            rating = biz.get('rating', 0)
-            if rating is None:
-                rating = 0
-                
-            lead = Lead(
-                lead_id=f"lead_{int(time.time())}_{i}_{random.randint(1000,9999)}",
-                campaign_id=cid,
-                user_id=uid,
-                name=biz.get('name', 'Contact'),
-                company=biz.get('company', biz.get('name', 'Unknown')),
-                email=biz.get('email', ''),
-                phone=biz.get('phone', ''),
-                facebook_url=biz.get('facebook_url', ''),
-                website=biz.get('website', ''),
-                industry=biz.get('industry', campaign.search_queries[0] if campaign.search_queries else ''),
-                location=biz.get('location', ''),
-                country=biz.get('country', ''),
-                place_id=biz.get('place_id', ''),
-                rating=rating,
-                total_ratings=biz.get('total_ratings', 0),
-                price_level=biz.get('price_level', 0),
-                business_status=biz.get('business_status', ''),
-                types=biz.get('types', ''),
+        default_industry = campaign.search_queries[0] if campaign.search_queries else ''
+        leads = [
+            LeadProcessor.lead_from_business(
+                biz, cid, uid,
                 source=biz.get('source', LeadSource.GOOGLE_PLACES.value),
-                status=LeadStatus.PENDING.value,
-                created_at=datetime.datetime.now().isoformat(),
-                updated_at=datetime.datetime.now().isoformat()
+                industry=default_industry
             )
-            
-            lead.qualification_score = LeadProcessor.score_lead(lead, campaign)
-            leads.append(lead)
+            for biz in discovered
+        ]
+        LeadProcessor.score_leads(leads, campaign)
         
         db.save_leads(uid, cid, leads)
         print(f"✅ Discovered {len(leads)} leads")
-        flash(f'Discovery complete! Found {len(leads)} new leads.', 'success')
 
-    Thread(target=discover, args=(session['user_id'], campaign_id, campaign, api_key)).start()
+    run_in_background(discover, session['user_id'], campaign_id, campaign, api_key)
     return redirect(url_for('campaign_detail', campaign_id=campaign_id))
 
 @app.route('/campaign/<campaign_id>/send-messages', methods=['POST'])
@@ -1693,25 +2518,31 @@ def send_messages(campaign_id):
         flash(f'No leads with {channel} contact info', 'info')
         return redirect(url_for('campaign_detail', campaign_id=campaign_id))
 
+    db.increment_contact_attempts([lead.lead_id for lead in leads])
     for lead in leads:
         lead.contact_attempts += 1
-        db.update_lead(lead)
 
     flash(f'Started sending {len(leads)} messages via {channel} in background', 'success')
 
     def send(uid, cid, campaign, leads, channel, user):
-        for lead in leads:
-            try:
-                message = message_service.send_campaign_message(lead, campaign, channel, user)
-                if message:
-                    db.save_message(uid, message)
-                    lead.last_contacted = message.sent_at
-                    db.update_lead(lead)
-                time.sleep(random.uniform(1, 3))  # Random delay between messages
-            except Exception as e:
-                print(f"Error sending message to {lead.lead_id}: {e}")
+        sent = []  # (message, lead) pairs waiting to be written
 
-    Thread(target=send, args=(session['user_id'], campaign_id, campaign, leads, channel, user)).start()
+        def flush():
+            try:
+                db.record_sent_messages(uid, sent)
+            except sqlite3.Error as e:
+                print(f"Error saving sent messages: {e}")
+            sent.clear()
+
+        for lead, message in message_service.send_batch(leads, campaign, channel, user):
+            if message:
+                lead.last_contacted = message.sent_at
+                sent.append((message, lead))
+                if len(sent) >= SEND_FLUSH_EVERY:
+                    flush()
+        flush()
+
+    run_in_background(send, session['user_id'], campaign_id, campaign, leads, channel, user)
     return redirect(url_for('campaign_detail', campaign_id=campaign_id))
 
 # ============================================================================
@@ -1768,35 +2599,13 @@ def save_search_to_campaign():
     if not campaign:
         return jsonify({'error': 'Campaign not found'}), 404
     
-    leads = []
-    for i, biz in enumerate(businesses):
-        rating = biz.get('rating', 0)
-        if rating is None:
-            rating = 0
-            
-        lead = Lead(
-            lead_id=f"lead_{int(time.time())}_{i}_{random.randint(1000,9999)}",
-            campaign_id=campaign_id,
-            user_id=session['user_id'],
-            name=biz.get('name', 'Contact'),
-            company=biz.get('company', biz.get('name', 'Unknown')),
-            email='',
-            phone=biz.get('phone', ''),
-            facebook_url=biz.get('facebook_url', ''),
-            website=biz.get('website', ''),
-            industry=biz.get('industry', ''),
-            location=biz.get('location', ''),
-            country=biz.get('country', ''),
-            place_id=biz.get('place_id', ''),
-            rating=rating,
-            total_ratings=biz.get('total_ratings', 0),
-            source=LeadSource.MANUAL_SEARCH.value,
-            status=LeadStatus.PENDING.value,
-            created_at=datetime.datetime.now().isoformat(),
-            updated_at=datetime.datetime.now().isoformat()
+    leads = [
+        LeadProcessor.lead_from_business(
+            biz, campaign_id, session['user_id'], source=LeadSource.MANUAL_SEARCH.value
         )
-        lead.qualification_score = LeadProcessor.score_lead(lead, campaign)
-        leads.append(lead)
+        for biz in businesses
+    ]
+    LeadProcessor.score_leads(leads, campaign)
     
     db.save_leads(session['user_id'], campaign_id, leads)
     
@@ -1822,7 +2631,6 @@ def lead_detail(lead_id):
     
     messages = db.get_lead_messages(lead_id)
     campaign = db.get_campaign(lead.campaign_id)
-    user = db.get_user(session['user_id'])
     
     # Generate WhatsApp link if phone exists
     whatsapp_link = None
@@ -1873,45 +2681,45 @@ def analytics_dashboard():
         return redirect(url_for('index'))
     
     campaigns = db.get_user_campaigns(session['user_id'])
-    all_stats = []
-    
-    for c in campaigns:
-        try:
-            stats = analytics.get_campaign_stats(db, session['user_id'], c.campaign_id)
-            all_stats.append(stats)
-        except Exception as e:
-            print(f"Error getting analytics for {c.campaign_id}: {e}")
-            # Append empty stats
-            all_stats.append({
-                'campaign_name': c.name,
-                'total_leads': 0,
-                'hot_leads': 0,
-                'total_sent': 0,
-                'avg_rating': 0,
-                'channel_stats': {
-                    'email': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0},
-                    'whatsapp': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0},
-                    'facebook': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0}
-                }
-            })
+    try:
+        stats_by_id = analytics.get_all_campaign_stats(db, session['user_id'], campaigns)
+    except Exception as e:
+        print(f"Error getting analytics: {e}")
+        stats_by_id = {}
+    # Empty stats for any campaign that failed
+    all_stats = [stats_by_id.get(c.campaign_id) or {
+        'campaign_name': c.name,
+        'total_leads': 0,
+        'hot_leads': 0,
+        'total_sent': 0,
+        'avg_rating': 0,
+        'channel_stats': {
+            'email': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0},
+            'whatsapp': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0},
+            'facebook': {'sent': 0, 'failed': 0, 'read': 0, 'replied': 0}
+        }
+    } for c in campaigns]
     
-    # Aggregate stats
-    total_leads = sum(s.get('total_leads', 0) for s in all_stats)
-    total_hot = sum(s.get('hot_leads', 0) for s in all_stats)
-    total_messages = sum(s.get('total_sent', 0) for s in all_stats)
+    # Aggregate stats, summed in SQL
+    try:
+        totals = db.get_user_totals(session['user_id'])
+    except Exception as e:
+        print(f"Error getting analytics totals: {e}")
+        totals = dict.fromkeys(('total_leads', 'total_hot', 'total_messages',
+                                'email_sent', 'whatsapp_sent', 'facebook_sent'), 0)
     
     # Channel breakdown
     channel_totals = {
-        'email': sum(s.get('channel_stats', {}).get('email', {}).get('sent', 0) for s in all_stats),
-        'whatsapp': sum(s.get('channel_stats', {}).get('whatsapp', {}).get('sent', 0) for s in all_stats),
-        'facebook': sum(s.get('channel_stats', {}).get('facebook', {}).get('sent', 0) for s in all_stats)
+        'email': totals['email_sent'],
+        'whatsapp': totals['whatsapp_sent'],
+        'facebook': totals['facebook_sent']
     }
     
     return render_template('analytics.html', 
                           stats=all_stats, 
-                          total_leads=total_leads,
-                          total_hot=total_hot,
-                          total_messages=total_messages,
+                          total_leads=totals['total_leads'],
+                          total_hot=totals['total_hot'],
+                          total_messages=totals['total_messages'],
                           channel_totals=channel_totals,
                           total_campaigns=len(campaigns))
 
@@ -1923,6 +2731,17 @@ def analytics_dashboard():
 def health_check():
     return '', 200
 
+def health_middleware(wsgi_app):
+    """Answer platform health probes before Flask builds a request context"""
+    def middleware(environ, start_response):
+        if environ.get('PATH_INFO') == '/health' and environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            start_response('200 OK', [('Content-Length', '0')])
+            return [b'']
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = health_middleware(app.wsgi_app)
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -1932,13 +2751,18 @@ def create_default_user():
         admin = User(
             user_id=f"user_{int(time.time())}",
             username='admin',
-            password_hash='admin123',
+            password_hash=hash_password('admin123'),
             email='admin@example.com',
             created_at=datetime.datetime.now().isoformat()
         )
         db.create_user(admin)
         print("✅ Default admin user created (admin/admin123)")
 
+def precompile_templates():
+    """Load every template once so the in-memory and bytecode caches are warm"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
 def open_browser():
     time.sleep(2)
     webbrowser.open('http://localhost:5000')
@@ -1970,4 +2794,5 @@ if __name__ == "__main__":
     print(f"🌐 Binding to 0.0.0.0:{port}")
     
     # Make sure the app is properly configured for production
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    precompile_templates()
+    app.run(host='0.0.0.0', port=port, debug=DEBUG)
\ No newline at end of file
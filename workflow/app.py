@@ -1,18 +1,29 @@
 import os
-import json
+import sys
+import string
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 from datetime import datetime
+from urllib.parse import urlencode
 from flask import Flask, request, jsonify, render_template, send_from_directory
 from dotenv import load_dotenv
 import smtplib
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from twilio.rest import Client
 import facebook
 import telebot  # for Telegram
 
+# RateLimiter and OrjsonProvider are shared with main.py via the repo root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import RateLimiter, OrjsonProvider
+
 load_dotenv()
 
 app = Flask(__name__, 
@@ -20,6 +31,9 @@ app = Flask(__name__,
             static_folder='.',
             template_folder='.')
 
+# VAPI reports carry full transcripts, so webhook JSON goes through orjson
+app.json = OrjsonProvider(app)
+
 # ---------------------------
 # Configuration
 # ---------------------------
@@ -56,18 +70,53 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 # Global flag for background thread
 calling_active = True
 
+# ---------------------------
+# HTTP Session
+# ---------------------------
+# One pooled session for every outbound API call, so connections (and their
+# TLS handshakes) are reused across Airtable, VAPI, Calendly and Graph calls.
+# POST is not retried: a repeated create or call request could duplicate it.
+HTTP_RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("GET", "PATCH"),
+    raise_on_status=False,
+)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=HTTP_RETRY)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+# Airtable locks a base out for 30s after a 429, so back off harder there
+SESSION.mount("https://api.airtable.com", HTTPAdapter(
+    pool_connections=20, pool_maxsize=50,
+    max_retries=HTTP_RETRY.new(backoff_factor=2)
+))
+
+# (connect, read) seconds
+HTTP_TIMEOUT = (3.05, 15)
+
+# Airtable allows 5 requests per second per base; every Airtable call in
+# the process (caller thread, webhooks, uploads) shares this budget
+AIRTABLE_LIMITER = RateLimiter(rate=5)
+
+AIRTABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}"
+# Built once; kept off SESSION.headers so the key never goes to other hosts
+AIRTABLE_HEADERS = {
+    "Authorization": f"Bearer {AIRTABLE_API_KEY}",
+    "Content-Type": "application/json"
+}
+
 # ---------------------------
 # Helper Functions
 # ---------------------------
-def airtable_request(method, table, record_id=None, data=None):
-    """Generic Airtable API request."""
-    base_url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{table}"
+def airtable_request(method, table, record_id=None, data=None, params=None):
+    """Generic Airtable API request, paced by AIRTABLE_LIMITER."""
+    base_url = f"{AIRTABLE_URL}/{table}"
     url = f"{base_url}/{record_id}" if record_id else base_url
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    response = requests.request(method, url, headers=headers, json=data)
+    AIRTABLE_LIMITER.acquire()
+    response = SESSION.request(method, url, headers=AIRTABLE_HEADERS, json=data, params=params,
+                               timeout=HTTP_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
@@ -81,21 +130,88 @@ def update_airtable_record(table, record_id, fields):
     data = {"fields": fields}
     return airtable_request("PATCH", table, record_id=record_id, data=data)
 
+# Airtable's batch endpoints take at most 10 records per request
+AIRTABLE_BATCH_SIZE = 10
+
+def batch_create_airtable(table, fields_list):
+    """Create records in batches of up to 10 per request."""
+    created = []
+    for i in range(0, len(fields_list), AIRTABLE_BATCH_SIZE):
+        chunk = fields_list[i:i + AIRTABLE_BATCH_SIZE]
+        data = {"records": [{"fields": f} for f in chunk], "typecast": True}
+        created.extend(airtable_request("POST", table, data=data).get("records", []))
+    return created
+
+def batch_update_airtable(table, updates):
+    """Update (record_id, fields) pairs in batches of up to 10 per request."""
+    for i in range(0, len(updates), AIRTABLE_BATCH_SIZE):
+        chunk = updates[i:i + AIRTABLE_BATCH_SIZE]
+        data = {"records": [{"id": record_id, "fields": f} for record_id, f in chunk]}
+        airtable_request("PATCH", table, data=data)
+
 def get_airtable_record(table, record_id):
     """Retrieve a record by ID."""
     return airtable_request("GET", table, record_id=record_id)
 
+# Fields each Airtable query reads; asking only for these keeps responses
+# small (lead records also carry transcripts)
+NOTIFICATION_FIELDS = ["UserID", "email", "sms", "whatsapp", "facebook", "telegram",
+                       "email_address", "phone_number", "whatsapp_number",
+                       "facebook_psid", "telegram_chat_id"]
+PENDING_LEAD_FIELDS = ["Phone", "Name", "Script", "UserID", "Status"]
+
+class BoundedDict:
+    """Thread-safe dict holding at most `max_size` entries; once full, the
+    oldest entry is dropped (dicts keep insertion order)"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)  # a re-put entry counts as newest
+            if len(self._data) >= self.max_size:
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = value
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+# Notification preferences rarely change, so they are cached per user for a
+# few minutes; update_notification_settings drops the user's entry
+NOTIFICATION_SETTINGS_TTL = 300  # seconds
+NOTIFICATION_SETTINGS_MAX = 10_000
+_notification_settings_cache = BoundedDict(NOTIFICATION_SETTINGS_MAX)  # user_id -> (expires_at, settings)
+
 def get_user_notification_settings(user_id):
-    """Get user's notification preferences."""
+    """Get user's notification preferences (cached)."""
+    now = time.monotonic()
+    cached = _notification_settings_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    settings = fetch_user_notification_settings(user_id)
+    _notification_settings_cache.put(user_id, (now + NOTIFICATION_SETTINGS_TTL, settings))
+    return settings
+
+def forget_user_notification_settings(user_id):
+    _notification_settings_cache.pop(user_id)
+
+def fetch_user_notification_settings(user_id):
+    """Get user's notification preferences from Airtable."""
     params = {
         "filterByFormula": f"{{UserID}} = '{user_id}'",
-        "maxRecords": 1
+        "maxRecords": 1,
+        "fields[]": NOTIFICATION_FIELDS
     }
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_NOTIFICATIONS_TABLE}"
-    headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    records = response.json().get("records", [])
+    records = airtable_request("GET", AIRTABLE_NOTIFICATIONS_TABLE, params=params).get("records", [])
     if records:
         return records[0]["fields"]
     return {
@@ -115,24 +231,35 @@ def find_pending_leads(limit=5):
     """Fetch leads with status 'pending'."""
     params = {
         "filterByFormula": "{Status} = 'pending'",
-        "maxRecords": limit
+        "maxRecords": limit,
+        "fields[]": PENDING_LEAD_FIELDS
     }
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_LEADS_TABLE}"
-    headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    return response.json().get("records", [])
+    return airtable_request("GET", AIRTABLE_LEADS_TABLE, params=params).get("records", [])
+
+def list_airtable_records(table, params):
+    """Fetch every record matching `params`, following Airtable's offset pages."""
+    params = {**params, "pageSize": 100}
+    records = []
+    while True:
+        data = airtable_request("GET", table, params=params)
+        records.extend(data.get("records", []))
+        if not data.get("offset"):
+            return records
+        params["offset"] = data["offset"]
+
+# Calls still in 'calling' status after this long are treated as stuck
+STUCK_CALL_HOURS = 1
 
 def find_calling_leads():
-    """Fetch leads that are currently in 'calling' status (stuck calls)."""
+    """Fetch leads stuck in 'calling' status for over STUCK_CALL_HOURS."""
     params = {
-        "filterByFormula": "{Status} = 'calling'"
+        "filterByFormula": (
+            "AND({Status} = 'calling', "
+            f"IS_BEFORE(DATETIME_PARSE({{CalledAt}}), DATEADD(NOW(), -{STUCK_CALL_HOURS}, 'hours')))"
+        ),
+        "fields[]": ["Status"]  # only the record id is used
     }
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_LEADS_TABLE}"
-    headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    return response.json().get("records", [])
+    return list_airtable_records(AIRTABLE_LEADS_TABLE, params)
 
 def create_memberstack_member(email, password):
     """Create a member in MemberStack."""
@@ -146,19 +273,75 @@ def create_memberstack_member(email, password):
         "password": password,
         "metaData": {"plan": "premium"}
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = SESSION.post(url, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
-def send_welcome_email(to_email, name, temporary_password):
-    """Send a welcome email via SMTP."""
-    subject = "Welcome to The First Client Engine"
-    body = f"""
-    Hi {name},
+class EmailSender:
+    """One logged-in SMTP connection reused across emails.
+
+    smtplib isn't thread-safe, so sends are serialized on a lock. A session
+    the server has dropped is detected with NOOP and reopened.
+    """
+
+    def __init__(self, host, port, user, password):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        server.login(self.user, self.password)
+        return server
+
+    def _alive(self):
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def send(self, msg):
+        with self._lock:
+            if self._smtp is None or not self._alive():
+                self.close()
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+                # Dropped between the NOOP and the send; reconnect once
+                self.close()
+                self._smtp = self._connect()
+                self._smtp.send_message(msg)
+
+EMAILER = EmailSender(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD)
+
+def plain_email(to_email, subject, body):
+    """Build a plain-text message; no multipart wrapper needed for one part."""
+    msg = MIMEText(body, "plain")
+    msg["From"] = SMTP_USER
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    return msg
+
+WELCOME_SUBJECT = "Welcome to The First Client Engine"
+WELCOME_TEMPLATE = string.Template("""
+    Hi ${name},
 
     Your account is ready! Login at http://localhost:5000/dashboard
 
-    Your temporary password is {temporary_password} (please change it).
+    Your temporary password is ${password} (please change it).
 
     Next steps:
     1. Set up your notification preferences (Email, WhatsApp, SMS, Facebook)
@@ -168,17 +351,17 @@ def send_welcome_email(to_email, name, temporary_password):
     You'll receive instant alerts when hot leads are found!
 
     - The Team
-    """
-    msg = MIMEMultipart()
-    msg["From"] = SMTP_USER
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
+    """)
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
+def send_welcome_email(to_email, name, temporary_password):
+    """Send a welcome email via SMTP."""
+    body = WELCOME_TEMPLATE.substitute(name=name, password=temporary_password)
+    EMAILER.send(plain_email(to_email, WELCOME_SUBJECT, body))
+
+# Calls this process started, so a report that lost its metadata can still
+# be matched to its lead without querying Airtable by VapiCallId
+VAPI_CALLS_MAX = 10_000
+_vapi_calls = BoundedDict(VAPI_CALLS_MAX)  # call_id -> metadata sent with the call
 
 def start_vapi_call(lead_phone, lead_name, script, lead_id, user_id):
     """Start a VAPI call and track it."""
@@ -189,6 +372,12 @@ def start_vapi_call(lead_phone, lead_name, script, lead_id, user_id):
     }
     
     # Include metadata for webhook
+    metadata = {
+        "lead_id": lead_id,
+        "user_id": user_id,
+        "lead_name": lead_name,
+        "lead_phone": lead_phone
+    }
     payload = {
         "assistantId": VAPI_ASSISTANT_ID,
         "customer": {
@@ -197,19 +386,22 @@ def start_vapi_call(lead_phone, lead_name, script, lead_id, user_id):
         },
         "assistantOverrides": {
             "variableValues": {
-                "script": script
+                "script": script,
+                # Echoed back with the call object even if metadata is dropped
+                "lead_id": lead_id,
+                "user_id": user_id
             }
         },
-        "metadata": {
-            "lead_id": lead_id,
-            "user_id": user_id
-        }
+        "metadata": metadata
     }
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = SESSION.post(url, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
-        return response.json()
+        call = response.json()
+        if call.get("id"):
+            _vapi_calls.put(call["id"], metadata)
+        return call
     except Exception as e:
         print(f"Error starting VAPI call: {e}")
         # If call fails, reset lead status
@@ -231,7 +423,7 @@ def create_calendly_link():
         "owner": f"https://api.calendly.com/users/{CALENDLY_USER_UUID}"
     }
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = SESSION.post(url, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         return data.get("resource", {}).get("booking_url")
@@ -242,71 +434,99 @@ def create_calendly_link():
 # ---------------------------
 # Notification Functions
 # ---------------------------
+# Channels of one alert are sent side by side, so it takes as long as the
+# slowest channel rather than the sum of all of them
+NOTIFIER_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="notifier")
+NOTIFY_TIMEOUT = 15  # seconds to wait for all channels of one alert
+
+# API clients are built once and shared; None when the channel isn't configured
+TWILIO_CLIENT = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ACCOUNT_SID else None
+TELEGRAM_BOT = telebot.TeleBot(TELEGRAM_BOT_TOKEN) if TELEGRAM_BOT_TOKEN else None
 def send_email_notification(to_email, subject, message):
     """Send email notification."""
     try:
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_USER
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(message, "plain"))
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
+        EMAILER.send(plain_email(to_email, subject, message))
         return True
     except Exception as e:
         print(f"Email error: {e}")
         return False
 
-def send_sms_notification(to_number, message):
-    """Send SMS notification via Twilio."""
-    try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_number
-        )
-        return True
-    except Exception as e:
-        print(f"SMS error: {e}")
+# Twilio channel -> (sender, recipient prefix, label for logs)
+TWILIO_CHANNELS = {
+    "sms": (TWILIO_PHONE_NUMBER, "", "SMS"),
+    "whatsapp": (TWILIO_WHATSAPP_NUMBER, "whatsapp:", "WhatsApp"),
+}
+
+def send_twilio(to_number, message, *, channel):
+    """Send an SMS or WhatsApp notification through the shared Twilio client."""
+    from_number, prefix, label = TWILIO_CHANNELS[channel]
+    if not TWILIO_CLIENT:
+        print(f"{label} error: Twilio is not configured")
         return False
-
-def send_whatsapp_notification(to_number, message):
-    """Send WhatsApp notification via Twilio."""
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        client.messages.create(
+        TWILIO_CLIENT.messages.create(
             body=message,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=f"whatsapp:{to_number}"
+            from_=from_number,
+            to=f"{prefix}{to_number}"
         )
         return True
     except Exception as e:
-        print(f"WhatsApp error: {e}")
+        print(f"{label} error: {e}")
         return False
 
+FB_GRAPH_URL = "https://graph.facebook.com"
+FB_MESSAGES_PATH = "v12.0/me/messages"
+FB_BATCH_SIZE = 50  # Graph API limit per batch request
+
 def send_facebook_notification(psid, message):
     """Send Facebook Messenger notification."""
     try:
-        url = f"https://graph.facebook.com/v12.0/me/messages?access_token={FB_PAGE_ACCESS_TOKEN}"
         payload = {
             "recipient": {"id": psid},
             "message": {"text": message}
         }
-        response = requests.post(url, json=payload)
+        # Token as a param, not baked into the URL string
+        response = SESSION.post(f"{FB_GRAPH_URL}/{FB_MESSAGES_PATH}",
+                                params={"access_token": FB_PAGE_ACCESS_TOKEN},
+                                json=payload, timeout=HTTP_TIMEOUT)
         return response.ok
     except Exception as e:
         print(f"Facebook error: {e}")
         return False
 
+def send_facebook_notifications_batch(psid_message_pairs):
+    """Send many Messenger messages, up to 50 per Graph API batch request.
+    Returns one success flag per (psid, message) pair."""
+    results = []
+    for i in range(0, len(psid_message_pairs), FB_BATCH_SIZE):
+        chunk = psid_message_pairs[i:i + FB_BATCH_SIZE]
+        batch = [{
+            "method": "POST",
+            "relative_url": FB_MESSAGES_PATH,
+            "body": urlencode({
+                "recipient": orjson.dumps({"id": psid}).decode(),
+                "message": orjson.dumps({"text": message}).decode()
+            })
+        } for psid, message in chunk]
+        try:
+            response = SESSION.post(FB_GRAPH_URL, data={
+                "access_token": FB_PAGE_ACCESS_TOKEN,
+                "batch": orjson.dumps(batch).decode()
+            }, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            results.extend(bool(r) and r.get("code") == 200 for r in response.json())
+        except Exception as e:
+            print(f"Facebook batch error: {e}")
+            results.extend([False] * len(chunk))
+    return results
+
 def send_telegram_notification(chat_id, message):
     """Send Telegram notification."""
+    if not TELEGRAM_BOT:
+        print("Telegram error: bot token is not configured")
+        return False
     try:
-        bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
-        bot.send_message(chat_id, message)
+        TELEGRAM_BOT.send_message(chat_id, message)
         return True
     except Exception as e:
         print(f"Telegram error: {e}")
@@ -330,21 +550,25 @@ Book this call now before they lose interest!
     if transcript:
         message += f"\nCall Transcript:\n{transcript[:500]}..."  # First 500 chars
     
-    # Send through each enabled channel
+    # Send through each enabled channel, concurrently
+    tasks = []
     if settings.get("email") and settings.get("email_address"):
-        send_email_notification(settings["email_address"], subject, message)
+        tasks.append((send_email_notification, settings["email_address"], subject, message))
     
     if settings.get("sms") and settings.get("phone_number"):
-        send_sms_notification(settings["phone_number"], message[:160])  # SMS length limit
+        tasks.append((partial(send_twilio, channel="sms"), settings["phone_number"], message[:160]))  # SMS length limit
     
     if settings.get("whatsapp") and settings.get("whatsapp_number"):
-        send_whatsapp_notification(settings["whatsapp_number"], message)
+        tasks.append((partial(send_twilio, channel="whatsapp"), settings["whatsapp_number"], message))
     
     if settings.get("facebook") and settings.get("facebook_psid"):
-        send_facebook_notification(settings["facebook_psid"], message[:320])  # FB limit
+        tasks.append((send_facebook_notification, settings["facebook_psid"], message[:320]))  # FB limit
     
     if settings.get("telegram") and settings.get("telegram_chat_id"):
-        send_telegram_notification(settings["telegram_chat_id"], message)
+        tasks.append((send_telegram_notification, settings["telegram_chat_id"], message))
+    
+    futures = [NOTIFIER_POOL.submit(*task) for task in tasks]
+    wait(futures, timeout=NOTIFY_TIMEOUT)
 
 def send_call_summary(user_id, lead_name, outcome, recording_url=None):
     """Send daily/weekly call summary."""
@@ -366,72 +590,121 @@ Outcome: {outcome}
 # ---------------------------
 # Background Calling Thread
 # ---------------------------
+# Leads are dialled as soon as upload_leads queues them; polling Airtable for
+# pending leads is only a recovery path (leads added elsewhere, restarts)
+CALL_QUEUE = queue.Queue()
+_queued_call_ids = set()  # ids in CALL_QUEUE, so a recovery poll doesn't queue them twice
+_queued_call_ids_lock = threading.Lock()  # upload requests and the caller both queue
+PENDING_POLL_INTERVAL = 300  # seconds
+STUCK_SWEEP_INTERVAL = 600  # seconds; "stuck" means over an hour, so this is plenty
+CALL_SPACING = 10  # seconds between calls, to avoid rate limits
+
+def enqueue_call(lead):
+    """Queue an Airtable lead record for the background caller."""
+    with _queued_call_ids_lock:
+        if lead["id"] in _queued_call_ids:
+            return
+        _queued_call_ids.add(lead["id"])
+    CALL_QUEUE.put(lead)
+
+def call_lead(lead):
+    """Start a VAPI call for a lead record. Returns True if a call was attempted."""
+    lead_id = lead["id"]
+    fields = lead["fields"]
+    
+    lead_phone = fields.get("Phone")
+    lead_name = fields.get("Name")
+    script = fields.get("Script")
+    user_id = fields.get("UserID")  # Assuming you have this field
+    
+    if not all([lead_phone, script, user_id]):
+        print(f"Lead {lead_id} missing required fields")
+        # Take it out of 'pending' so the recovery poll stops returning it
+        update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
+            "Status": "invalid",
+            "Notes": "Missing Phone, Script or UserID",
+            "UpdatedAt": datetime.utcnow().isoformat()
+        })
+        return False
+    
+    print(f"Starting call to {lead_name} ({lead_phone})")
+    
+    # Update status to calling
+    update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
+        "Status": "calling",
+        "CalledAt": datetime.utcnow().isoformat()
+    })
+    
+    # Start VAPI call
+    vapi_response = start_vapi_call(
+        lead_phone, lead_name, script, lead_id, user_id
+    )
+    
+    if vapi_response:
+        update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
+            "VapiCallId": vapi_response.get("id")
+        })
+        print(f"Call started for lead {lead_id}")
+    else:
+        # Reset status if call failed
+        update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
+            "Status": "pending"
+        })
+    return True
+
+def reset_stuck_calls():
+    """Put leads stuck in 'calling' status back to pending."""
+    # find_calling_leads already applies the age cutoff in Airtable
+    resets = [(lead["id"], {
+        "Status": "pending",
+        "Notes": "Reset due to timeout"
+    }) for lead in find_calling_leads()]
+    # Reset stuck calls, 10 per request
+    batch_update_airtable(AIRTABLE_LEADS_TABLE, resets)
+    for lead_id, _ in resets:
+        print(f"Reset stuck lead {lead_id}")
+
+def stuck_call_sweeper():
+    """Background thread that resets stuck calls on its own schedule, so
+    the sweep never delays dialling."""
+    while calling_active:
+        try:
+            reset_stuck_calls()
+        except Exception as e:
+            print(f"Error resetting stuck calls: {e}")
+        time.sleep(STUCK_SWEEP_INTERVAL)
+
 def background_caller():
-    """Background thread that continuously makes calls."""
+    """Background thread that calls leads as they are queued."""
     global calling_active
     print("Background caller started - automatically calling leads...")
     
+    next_poll = 0  # poll on startup
     while calling_active:
         try:
-            # Find pending leads
-            pending_leads = find_pending_leads(limit=3)  # Process 3 at a time
+            now = time.monotonic()
+            if now >= next_poll and CALL_QUEUE.empty():
+                pending_leads = find_pending_leads(limit=3)  # Process 3 at a time
+                for lead in pending_leads:
+                    enqueue_call(lead)
+                next_poll = now + PENDING_POLL_INTERVAL
             
-            for lead in pending_leads:
-                lead_id = lead["id"]
-                fields = lead["fields"]
-                
-                lead_phone = fields.get("Phone")
-                lead_name = fields.get("Name")
-                script = fields.get("Script")
-                user_id = fields.get("UserID")  # Assuming you have this field
-                
-                if not all([lead_phone, script, user_id]):
-                    print(f"Lead {lead_id} missing required fields")
-                    continue
-                
-                print(f"Starting call to {lead_name} ({lead_phone})")
-                
-                # Update status to calling
-                update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
-                    "Status": "calling",
-                    "CalledAt": datetime.utcnow().isoformat()
-                })
-                
-                # Start VAPI call
-                vapi_response = start_vapi_call(
-                    lead_phone, lead_name, script, lead_id, user_id
-                )
-                
-                if vapi_response:
-                    update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
-                        "VapiCallId": vapi_response.get("id")
-                    })
-                    print(f"Call started for lead {lead_id}")
-                else:
-                    # Reset status if call failed
-                    update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
-                        "Status": "pending"
-                    })
-                
+            try:
+                lead = CALL_QUEUE.get(timeout=max(0.1, next_poll - time.monotonic()))
+            except queue.Empty:
+                continue
+            try:
+                called = call_lead(lead)
+            finally:
+                with _queued_call_ids_lock:
+                    _queued_call_ids.discard(lead["id"])
+            if called:
                 # Wait between calls to avoid rate limits
-                time.sleep(10)  # 10 seconds between calls
-            
-            # Check for stuck calls (in 'calling' status for too long)
-            stuck_leads = find_calling_leads()
-            for lead in stuck_leads:
-                called_at = lead["fields"].get("CalledAt")
-                if called_at:
-                    called_time = datetime.fromisoformat(called_at)
-                    if (datetime.utcnow() - called_time).seconds > 3600:  # 1 hour
-                        # Reset stuck call
-                        update_airtable_record(AIRTABLE_LEADS_TABLE, lead["id"], {
-                            "Status": "pending",
-                            "Notes": "Reset due to timeout"
-                        })
-                        print(f"Reset stuck lead {lead['id']}")
-            
-            # Wait before next batch
-            time.sleep(30)  # Check every 30 seconds
+                time.sleep(CALL_SPACING)
+                if CALL_QUEUE.empty():
+                    # Leads are being dialled, so keep draining any pending
+                    # backlog instead of waiting for the next recovery poll
+                    next_poll = time.monotonic()
             
         except Exception as e:
             print(f"Error in background caller: {e}")
@@ -440,6 +713,29 @@ def background_caller():
 # Start background thread
 caller_thread = threading.Thread(target=background_caller, daemon=True)
 caller_thread.start()
+threading.Thread(target=stuck_call_sweeper, daemon=True).start()
+
+# ---------------------------
+# Webhook Job Queue
+# ---------------------------
+# Webhooks enqueue their follow-up work (Airtable, Calendly, MemberStack,
+# notifications) and return 200 at once, so senders don't time out and retry
+JOB_QUEUE = queue.Queue()
+JOB_WORKERS = 2
+
+def job_worker():
+    """Run queued (func, args) jobs one at a time."""
+    while True:
+        func, args = JOB_QUEUE.get()
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Error in {func.__name__}: {e}")
+        finally:
+            JOB_QUEUE.task_done()
+
+for _ in range(JOB_WORKERS):
+    threading.Thread(target=job_worker, daemon=True).start()
 
 # ---------------------------
 # HTML Page Routes
@@ -509,12 +805,11 @@ def update_notification_settings():
     
     # Check if settings exist
     params = {
-        "filterByFormula": f"{{UserID}} = '{user_id}'"
+        "filterByFormula": f"{{UserID}} = '{user_id}'",
+        "maxRecords": 1,
+        "fields[]": ["UserID"]  # only the record id is used
     }
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_NOTIFICATIONS_TABLE}"
-    headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
-    response = requests.get(url, headers=headers, params=params)
-    records = response.json().get("records", [])
+    records = airtable_request("GET", AIRTABLE_NOTIFICATIONS_TABLE, params=params).get("records", [])
     
     fields = {
         "UserID": user_id,
@@ -537,6 +832,7 @@ def update_notification_settings():
     else:
         # Create new
         create_airtable_record(AIRTABLE_NOTIFICATIONS_TABLE, fields)
+    forget_user_notification_settings(user_id)
     
     return jsonify({"status": "success"})
 
@@ -554,21 +850,22 @@ def upload_leads():
     leads = data.get("leads", [])
     user_id = data.get("user_id", "default_user")
     
-    count = 0
-    for lead in leads:
-        fields = {
-            "Name": lead.get("name"),
-            "Phone": lead.get("phone"),
-            "Status": "pending",
-            "Script": data.get("script", ""),
-            "UserID": user_id,
-            "CampaignId": campaign_id,
-            "CreatedAt": datetime.utcnow().isoformat()
-        }
-        create_airtable_record(AIRTABLE_LEADS_TABLE, fields)
-        count += 1
+    script = data.get("script", "")
+    created_at = datetime.utcnow().isoformat()
+    fields_list = [{
+        "Name": lead.get("name"),
+        "Phone": lead.get("phone"),
+        "Status": "pending",
+        "Script": script,
+        "UserID": user_id,
+        "CampaignId": campaign_id,
+        "CreatedAt": created_at
+    } for lead in leads]
+    # Dial the new leads right away instead of waiting for a poll
+    for record in batch_create_airtable(AIRTABLE_LEADS_TABLE, fields_list):
+        enqueue_call(record)
     
-    return jsonify({"status": "success", "count": count})
+    return jsonify({"status": "success", "count": len(fields_list)})
 
 # ---------------------------
 # Webhook Endpoints
@@ -576,55 +873,62 @@ def upload_leads():
 @app.route("/webhook/stripe", methods=["POST"])
 def stripe_webhook():
     """Handle Stripe checkout.session.completed events."""
-    payload = request.get_data(as_text=True)
-    event = json.loads(payload)
-    
+    raw = request.get_data()
+    # Most events aren't checkouts; skip parsing them. Stripe pretty-prints
+    # its JSON, so match the quoted value rather than the whole pair
+    if b'"checkout.session.completed"' not in raw:
+        return jsonify({"status": "ignored"}), 200
+
+    event = orjson.loads(raw)
     if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        customer_email = session.get("customer_email") or session["customer_details"]["email"]
-        customer_name = session["customer_details"]["name"]
-        stripe_customer_id = session["customer"]
-
-        # Create user record in Airtable
-        user_fields = {
-            "Email": customer_email,
-            "Name": customer_name,
-            "StripeCustomerId": stripe_customer_id,
-            "CreatedAt": datetime.utcnow().isoformat()
-        }
-        
-        try:
-            airtable_resp = create_airtable_record(AIRTABLE_USERS_TABLE, user_fields)
-            user_id = airtable_resp["id"]
-            
-            # Create MemberStack member
-            temp_password = os.urandom(8).hex()
-            memberstack_resp = create_memberstack_member(customer_email, temp_password)
-            
-            # Create default notification settings
-            notification_fields = {
-                "UserID": user_id,
-                "email": True,
-                "sms": False,
-                "whatsapp": False,
-                "facebook": False,
-                "telegram": False,
-                "email_address": customer_email,
-                "phone_number": "",
-                "whatsapp_number": "",
-                "facebook_psid": "",
-                "telegram_chat_id": ""
-            }
-            create_airtable_record(AIRTABLE_NOTIFICATIONS_TABLE, notification_fields)
-            
-            # Send welcome email
-            send_welcome_email(customer_email, customer_name, temp_password)
-            
-        except Exception as e:
-            print(f"Error in purchase flow: {e}")
+        JOB_QUEUE.put((process_checkout, (event["data"]["object"],)))
 
     return jsonify({"status": "ok"}), 200
 
+def process_checkout(session):
+    """Create the Airtable user, MemberStack member and settings for a purchase."""
+    customer_email = session.get("customer_email") or session["customer_details"]["email"]
+    customer_name = session["customer_details"]["name"]
+    stripe_customer_id = session["customer"]
+
+    # Create user record in Airtable
+    user_fields = {
+        "Email": customer_email,
+        "Name": customer_name,
+        "StripeCustomerId": stripe_customer_id,
+        "CreatedAt": datetime.utcnow().isoformat()
+    }
+    
+    try:
+        airtable_resp = create_airtable_record(AIRTABLE_USERS_TABLE, user_fields)
+        user_id = airtable_resp["id"]
+        
+        # Create MemberStack member
+        temp_password = os.urandom(8).hex()
+        memberstack_resp = create_memberstack_member(customer_email, temp_password)
+        
+        # Create default notification settings
+        notification_fields = {
+            "UserID": user_id,
+            "email": True,
+            "sms": False,
+            "whatsapp": False,
+            "facebook": False,
+            "telegram": False,
+            "email_address": customer_email,
+            "phone_number": "",
+            "whatsapp_number": "",
+            "facebook_psid": "",
+            "telegram_chat_id": ""
+        }
+        create_airtable_record(AIRTABLE_NOTIFICATIONS_TABLE, notification_fields)
+        
+        # Send welcome email
+        send_welcome_email(customer_email, customer_name, temp_password)
+        
+    except Exception as e:
+        print(f"Error in purchase flow: {e}")
+
 @app.route("/webhook/vapi", methods=["POST"])
 def vapi_webhook():
     """Handle VAPI end-of-call reports."""
@@ -632,32 +936,50 @@ def vapi_webhook():
     
     # Extract metadata
     metadata = payload.get("metadata", {})
+    call_id = payload.get("call", {}).get("id")
+    if not metadata.get("lead_id") and not call_id:
+        return jsonify({"error": "Could not identify lead"}), 400
+
+    JOB_QUEUE.put((process_vapi_report, (payload,)))
+    return jsonify({"status": "ok"}), 200
+
+def process_vapi_report(payload):
+    """Record a call outcome and alert the user about hot leads."""
+    call = payload.get("call", {})
+    metadata = (payload.get("metadata")
+                or _vapi_calls.get(call.get("id"))
+                or call.get("assistantOverrides", {}).get("variableValues", {}))
     lead_id = metadata.get("lead_id")
     user_id = metadata.get("user_id")
+    # The report echoes what start_vapi_call sent, so the lead's name and
+    # phone come from there rather than from another Airtable read
+    customer = payload.get("customer") or call.get("customer", {})
+    lead_name = metadata.get("lead_name") or customer.get("name")
+    lead_phone = metadata.get("lead_phone") or customer.get("number")
     
     if not lead_id:
-        # Try to find by call ID
-        call_id = payload.get("call", {}).get("id")
+        # Last resort (e.g. call started before a restart): find by call ID
         params = {
-            "filterByFormula": f"{{VapiCallId}} = '{call_id}'",
-            "maxRecords": 1
+            "filterByFormula": f"{{VapiCallId}} = '{call.get('id')}'",
+            "maxRecords": 1,
+            "fields[]": ["UserID", "Name", "Phone"]
         }
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_LEADS_TABLE}"
-        headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
-        response = requests.get(url, headers=headers, params=params)
-        records = response.json().get("records", [])
+        records = airtable_request("GET", AIRTABLE_LEADS_TABLE, params=params).get("records", [])
         if records:
             lead_id = records[0]["id"]
             user_id = records[0]["fields"].get("UserID")
+            lead_name = lead_name or records[0]["fields"].get("Name")
+            lead_phone = lead_phone or records[0]["fields"].get("Phone")
     
     if not lead_id or not user_id:
-        return jsonify({"error": "Could not identify lead"}), 400
+        print(f"VAPI report for unknown lead (call {call.get('id')})")
+        return
 
-    # Get lead details
-    lead = get_airtable_record(AIRTABLE_LEADS_TABLE, lead_id)
-    lead_fields = lead["fields"]
-    lead_name = lead_fields.get("Name")
-    lead_phone = lead_fields.get("Phone")
+    if not lead_name and not lead_phone:
+        # Calls started before the details were put in metadata
+        lead_fields = get_airtable_record(AIRTABLE_LEADS_TABLE, lead_id)["fields"]
+        lead_name = lead_fields.get("Name")
+        lead_phone = lead_fields.get("Phone")
 
     # Extract outcome
     analysis = payload.get("analysis", {}).get("summary", {})
@@ -665,6 +987,10 @@ def vapi_webhook():
     transcript = payload.get("transcript", "")
     recording_url = payload.get("recordingUrl", "")
 
+    # Get the booking link first so the lead is written in a single PATCH
+    is_hot = outcome.lower() in ["hot", "interested", "qualified"]
+    booking_link = create_calendly_link() if is_hot else None
+
     # Update lead
     update_fields = {
         "Status": outcome,
@@ -672,11 +998,13 @@ def vapi_webhook():
         "RecordingUrl": recording_url,
         "UpdatedAt": datetime.utcnow().isoformat()
     }
+    if booking_link:
+        update_fields["Status"] = "booking_sent"
+        update_fields["CalendlyLink"] = booking_link
     update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, update_fields)
 
-    # If hot lead, create Calendly link and send notifications
-    if outcome.lower() in ["hot", "interested", "qualified"]:
-        booking_link = create_calendly_link()
+    # If hot lead, send notifications with the booking link
+    if is_hot:
         if booking_link:
             # Send multi-channel notifications
             send_hot_lead_notification(
@@ -686,25 +1014,19 @@ def vapi_webhook():
                 booking_link=booking_link,
                 transcript=transcript
             )
-
-            # Update lead with booking link
-            update_airtable_record(AIRTABLE_LEADS_TABLE, lead_id, {
-                "Status": "booking_sent",
-                "CalendlyLink": booking_link,
-                "UpdatedAt": datetime.utcnow().isoformat()
-            })
     else:
         # Send summary for non-hot leads (optional)
         send_call_summary(user_id, lead_name, outcome, recording_url)
 
-    return jsonify({"status": "ok"}), 200
-
 @app.route("/webhook/facebook", methods=["POST"])
 def facebook_webhook():
     """Handle Facebook Messenger webhook for user setup."""
     data = request.get_json()
     
     if data.get("object") == "page":
+        # Facebook delivers several messaging events per POST; reply to all
+        # of them in one Graph API batch request
+        replies = []
         for entry in data.get("entry", []):
             for messaging in entry.get("messaging", []):
                 sender_id = messaging.get("sender", {}).get("id")
@@ -713,8 +1035,12 @@ def facebook_webhook():
                 if message.lower() == "connect":
                     # User wants to connect their Facebook
                     # You'd return a unique code or link to connect
-                    send_facebook_notification(sender_id, 
-                        "To connect your account, visit: http://localhost:5000/notifications?psid=" + sender_id)
+                    replies.append((sender_id,
+                        "To connect your account, visit: http://localhost:5000/notifications?psid=" + sender_id))
+        if len(replies) == 1:
+            send_facebook_notification(*replies[0])
+        elif replies:
+            send_facebook_notifications_batch(replies)
     
     return jsonify({"status": "ok"}), 200
 
@@ -727,4 +1053,6 @@ def health():
     }), 200
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see wsgi.py)
+    debug = os.getenv("FLASK_DEBUG", "").lower() in ("1", "true", "yes")
+    app.run(host="0.0.0.0", port=5000, debug=debug, threaded=True)
\ No newline at end of file
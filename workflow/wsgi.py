@@ -0,0 +1,9 @@
+"""WSGI entry point for production.
+
+    gunicorn -w 1 -k gthread --threads 32 --timeout 60 wsgi:app
+
+Keep a single worker process: app.py starts the background caller, job
+workers and in-memory caches at import, and every extra worker would dial
+the same pending leads again. Threads give the webhooks their concurrency.
+"""
+from app import app